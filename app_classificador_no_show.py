@@ -2,13 +2,29 @@
 # app_classificador_no_show.py
 
 import io
+import os
 import re
+import csv
+import sys
 import json
 import hashlib
+import time
+import uuid
+import threading
+import multiprocessing
+from collections import OrderedDict, deque
+from itertools import islice
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError
 from datetime import datetime
 import pandas as pd
 import streamlit as st
 
+from no_show_catalogo import (
+    AJUSTES_AUTO_FIX, ALTERNATIVAS_POR_ID, CATALOGO, CATALOGO_POR_ID, COLUNAS_BASE, COLUNAS_CAMPOS,
+    MapaColunas, NOMES_EFETIVOS, aplicar_aliases, build_mask, colunas_resultado, formato_csv, iterar_planilha,
+    nomes_efetivos, processar_bloco_lote, texto_celula, xlsx_para_csv,
+)
+
 # ---------------------------------------------------------
 # Aparência (toque azul-amarelo leve via CSS)
 # ---------------------------------------------------------
@@ -29,144 +45,8 @@ input, .stTextInput>div>div>input {border: 1px solid #38bdf8 !important;}
 
 st.title("Classificação No-show")
 
-# =========================================================
-# Helpers
-# =========================================================
-def slug(s: str) -> str:
-    s = re.sub(r"[^0-9a-zA-ZÀ-ÿ/ _-]+", "", str(s or ""))
-    s = s.strip().lower()
-    s = (s.replace("ç","c").replace("á","a").replace("à","a").replace("â","a").replace("ã","a")
-           .replace("é","e").replace("ê","e").replace("í","i")
-           .replace("ó","o").replace("ô","o").replace("õ","o")
-           .replace("ú","u").replace("ü","u"))
-    s = s.replace("/", "_")
-    s = re.sub(r"[^\w]+", "_", s)
-    s = re.sub(r"_+", "_", s)
-    return s.strip("_")
-
-def normalize_token(token: str) -> str:
-    """
-    Normaliza os [TOKENS] do catálogo para chaves de campos.
-    Suporta sufixos numéricos: [DATA 2], [HORA 3], [DATA/HORA 2], etc.
-    Retorna uma chave conhecida OU o próprio slug(token) se não houver mapeamento.
-    """
-    t = slug(token)
-
-    # Descrever problema
-    if ("descr" in t) and ("problem" in t):
-        return "descreber_o_problema"
-
-    # DATA/HORA 1..N
-    m = re.match(r"^data_hora(?:_(\d+))?$", t)
-    if m:
-        n = m.group(1)
-        if not n or n == "1":
-            return "__DATAHORA__"
-        if n == "2":
-            return "__DATAHORA2__"
-        if n == "3":
-            return "__DATAHORA3__"
-        return f"__DATAHORA{n}__"
-
-    # DATA 1..N
-    m = re.match(r"^data(?:_(\d+))?$", t)
-    if m:
-        n = m.group(1)
-        return f"data_{n}" if n and n != "1" else "data"
-
-    # HORA 1..N
-    m = re.match(r"^hora(?:_(\d+))?$", t)
-    if m:
-        n = m.group(1)
-        return f"hora_{n}" if n and n != "1" else "hora"
-
-    # Mapeamentos diretos / sinônimos
-    mapping = {
-        # nomes
-        "nome": "nome",
-        "cliente": "nome",
-        "nome_cliente": "nome",
-        "nome_tecnico": "nome_tecnico",
-        "tecnico": "nome_tecnico",
-
-        # canais / papéis
-        "canal": "canal",
-        "especialista": "especialista",
-
-        # numerações
-        "numero_ordem_de_servico": "numero_os",
-        "numero_os": "numero_os",
-        "numero": "asm",  # no texto de instabilidade, [NÚMERO] = ASM
-
-        # erro/tipo/explicação
-        "tipo": "tipo_erro",
-        "tipo_erro": "tipo_erro",
-        "explique_a_situacao": "explique",
-        "explique": "explique",
-
-        # equipamento / sistema
-        "equipamento_sistema": "equipamento_sistema",
-
-        # outros
-        "asm": "asm",
-        "motivo": "motivo",
-        "item": "item",
-
-        # aliases extra
-        "erro_de_agendamento_encaixe": "motivo",
-        "demanda_excedida": "motivo",
-        "descreva_situacao": "item",
-        "descreva_situação": "item",
-    }
-
-    if t in ("descreva", "descrever", "descrever_problema", "descrever_o_problema",
-             "descreva_o_problema", "descricao_do_problema"):
-        return "descreber_o_problema"
-
-    return mapping.get(t, t)
-
-def build_mask(template: str, values: dict) -> str:
-    """Substitui [TOKENS] do template pelos valores digitados e remove tokens desconhecidos."""
-    text = str(template or "")
-    tokens = re.findall(r"\[([^\]]+)\]", text)
-    for tok in tokens:
-        norm = normalize_token(tok)
-
-        # DATA/HORA 1..N
-        if norm.startswith("__DATAHORA"):
-            if norm == "__DATAHORA__":
-                d_key, h_key = "data", "hora"
-            elif norm == "__DATAHORA2__":
-                d_key, h_key = "data_2", "hora_2"
-            elif norm == "__DATAHORA3__":
-                d_key, h_key = "data_3", "hora_3"
-            else:
-                n = re.findall(r"__DATAHORA(\d+)__", norm)
-                n = n[0] if n else "1"
-                d_key, h_key = f"data_{n}", f"hora_{n}"
-            d = values.get(d_key, "").strip()
-            h = values.get(h_key, "").strip()
-            rep = (f"{d} - {h}" if d and h else (d or h or ""))
-            text = text.replace(f"[{tok}]", rep)
-            continue
-
-        # chave normalizada direta
-        if norm in values and values.get(norm, "") != "":
-            text = text.replace(f"[{tok}]", values.get(norm, "").strip())
-            continue
-
-        # fallback por slug literal
-        s = slug(tok)
-        if s in values and values.get(s, "") != "":
-            text = text.replace(f"[{tok}]", values.get(s, "").strip())
-            continue
-
-        # token sem valor -> remover
-        text = text.replace(f"[{tok}]", "")
-
-    text = re.sub(r"\s+\.", ".", text)
-    text = re.sub(r"\s{2,}", " ", text)
-    return text.strip()
+if AJUSTES_AUTO_FIX:
+    st.info("Ajustes automáticos de tokens aplicados:\n- " + "\n- ".join(AJUSTES_AUTO_FIX))
 
 # =========================================================
 # Limpeza (separadas)
@@ -181,448 +61,513 @@ def limpar_campos():
 def limpar_tabela():
     """Limpa apenas a tabela final (LINHAS), sem mexer nos inputs."""
     st.session_state.LINHAS = []
+    st.session_state.INDICE = IndiceTabela()
+    marcar_tabela_alterada()
 
 # =========================================================
-# Utilitários de campos
+# Linhas da tabela (registro compacto)
 # =========================================================
-def campos(*labels):
-    out = []
-    for lbl in labels:
-        if not lbl:
-            continue
-        out.append({"name": slug(lbl), "label": lbl, "placeholder": "", "required": True})
-    return out
+class Linha:
+    """
+    Registro compacto de uma linha da tabela.
+    Guarda só ids e valores digitados; os textos do catálogo (motivo, ação,
+    quando usar...) são juntados apenas na prévia/exportação.
+    """
+    __slots__ = ("motivo_id", "alt_id", "os", "valores", "mascara")
+
+    def __init__(self, motivo_id: str, alt_id: str, os: str, valores: tuple, mascara: str):
+        self.motivo_id = motivo_id
+        self.alt_id = alt_id
+        self.os = os
+        self.valores = valores
+        self.mascara = mascara
+
+def linha_para_registro(linha: Linha) -> dict:
+    """Expande a linha compacta no registro largo usado na prévia/exportação."""
+    motivo = CATALOGO_POR_ID[linha.motivo_id]
+    alternativa = ALTERNATIVAS_POR_ID[(linha.motivo_id, linha.alt_id)]
+    registro = {
+        "Número OS (consulta)": linha.os,
+        "Motivo": motivo["titulo"],
+        "Versão máscara": alternativa["rotulo"],
+        "Ação sistêmica": motivo.get("acao", ""),
+        "Quando usar": motivo.get("quando_usar", ""),
+        "Máscara": linha.mascara,
+    }
+    registro.update(zip(COLUNAS_CAMPOS[linha.motivo_id], linha.valores))
+    return registro
+
+def linhas_para_df(linhas) -> pd.DataFrame:
+    """Monta o DataFrame da tabela a partir das linhas compactas."""
+    if not linhas:
+        return pd.DataFrame()
+    return pd.DataFrame([linha_para_registro(l) for l in linhas])
+
+def colunas_tabela(linhas) -> list:
+    """Colunas da tabela completa, na mesma ordem que o DataFrame montado de uma vez."""
+    cols = dict.fromkeys(COLUNAS_BASE)
+    for motivo_id in dict.fromkeys(l.motivo_id for l in linhas):
+        cols.update(dict.fromkeys(COLUNAS_CAMPOS[motivo_id]))
+    return list(cols)
 
 # =========================================================
-# Catálogo completo (1–23) com exemplos
+# Índices da tabela (busca/filtro)
 # =========================================================
-CATALOGO = [
-    # 1
-    {
-        "id": "alteracao_tipo_servico",
-        "titulo": "Alteração do tipo de serviço  – De assistência para reinstalação",
-        "acao": "Inserir ação no histórico da OS e entrar em contato com a central para cancelamento",
-        "quando_usar": "Quando durante a prestação de serviço o técnico identificar a necessidade de realizar outro tipo de execução.",
-        "exemplos": [
-            "1) A OS está como assistência, mas será necessário fazer uma Reinstalação. Cliente voltará no dia seguinte.",
-            "2) Necessário uma reinstalação completa, sem tempo hábil para realizar o atendimento."
-        ],
-        "campos": campos("Descreber o Problema", "Cliente"),
-        "mascaras": [{
-            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
-            "template": "Não foi possível realizar o atendimento devido [DESCREVER O PROBLEMA]. Cliente [NOME] foi informado sobre a necessidade de reagendamento."
-        }]
-    },
-    # 2
-    {
-        "id": "improdutivo_ponto_fixo_movel",
-        "titulo": "Atendimento Improdutivo – Ponto Fixo/Móvel",
-        "acao": "Cancelar agendamento",
-        "quando_usar": "Quando o veículo está presente mas não foi possível atender (problema mecânico, elétrico ou condição do veículo). Se ponto móvel, considere também quando o atendimento em campo não pôde ser feito por fatores externos (chuva ou local sem condição).",
-        "exemplos": [
-            "1) O cliente trouxe o veículo, ele compareceu para atendimento, mas o veículo apresentou falhas elétrica.",
-            "2) O local para atendimento não possuía cobertura para atendimento. (chuva, etc.)."
-        ],
-        "campos": campos("Descreber o Problema"),
-        "mascaras": [{
-            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
-            "template": "Veículo compareceu para atendimento, porém por [DESCREVER O PROBLEMA], não foi possível realizar o serviço."
-        }]
-    },
-    # 3
-    {
-        "id": "pedido_cliente",
-        "titulo": "Cancelada a Pedido do Cliente",
-        "acao": "Cancelar agendamento",
-        "quando_usar": "Quando o próprio cliente solicita o cancelamento do atendimento.",
-        "exemplos": [
-            "1) Cliente ligou pedindo para remarcar porque o motorista estaria em viagem, ou porque não chegaria a tempo, ou veículo está na oficina.",
-            "2) Entramos em contato com o cliente para confirmar o atendimento ele disse que o veículo estará em viagem ou indisponível."
-        ],
-        "campos": campos("Nome", "Canal", "Data", "Hora"),
-        "mascaras": [{
-            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
-            "template": "Cliente [NOME], contato via [CANAL] em [DATA/HORA], informou indisponibilidade para o atendimento."
-        }]
-    },
-    # 4
-    {
-        "id": "pedido_rt",
-        "titulo": "Cancelamento a pedido da RT",
-        "acao": "Cancelar agendamento",
-        "quando_usar": "Quando houver necessidade de cancelamento por parte do representante técnico.",
-        "exemplos": ["Devido a situações de atendimento, precisamos cancelar com o cliente."],
-        "campos": campos("Descreber o Problema", "Nome", "Data", "Hora"),
-        "mascaras": [{
-            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
-            "template": "Não foi possível realizar o atendimento devido [DESCREVER O PROBLEMA]. Cliente [NOME] em [DATA/HORA], foi informado sobre a necessidade de reagendamento."
-        }]
-    },
-    # 5
-    {
-        "id": "cronograma_substituicao_placa",
-        "titulo": "Cronograma de Instalação/Substituição de Placa",
-        "acao": "Cancelar agendamento",
-        "quando_usar": "Quando o atendimento faz parte de cronograma especial pré-acordado / operação especial.",
-        "exemplos": [
-            "1) Cliente substituiu por essa OS 462270287.",
-            "2) Operação especial, sem envio de veículo como substituição."
-        ],
-        "campos": campos("Número OS"),
-        "mascaras": [
-            {
-                "id": "com_os", "rotulo": "Substituição com OS", "descricao": "", "regras_obrig": ["numero_os"],
-                "template": "Realizado atendimento com substituição de placa. Foi realizado a alteração pela OS [NÚMERO ORDEM DE SERVIÇO]."
-            },
-            {
-                "id": "sem_os", "rotulo": "Operação especial (sem envio de veículo)", "descricao": "", "regras_obrig": [],
-                "template": "Cliente não enviou veículo para atendimento."
-            }
-        ]
-    },
-    # 6
-    {
-        "id": "erro_cliente_desconhecia",
-        "titulo": "Erro De Agendamento - Cliente desconhecia o agendamento",
-        "acao": "Cancelar agendamento",
-        "quando_usar": "OS foi agendada sem que o cliente tivesse sido informado previamente, resultando em ausência ou recusa no momento do atendimento técnico. Obrigatório informar: Nome do cliente que entrou em contato, horário do cancelamento e canal de contato (preferencialmente canal que seja possível a futura comprovação).",
-        "exemplos": [
-            "1) Técnico chegou e o cliente disse não ter solicitado nenhum serviço ou foi entrado em contato com o cliente e o mesmo informou que desconhecia o agendamento.​",
-            "2) Realizamos contato com o cliente ele informou que desconhecia o agendamento."
-        ],
-        "campos": campos("Nome Cliente", "Data", "Hora"),
-        "mascaras": [{
-            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
-            "template": "Em contato com o cliente [NOME CLIENTE], o mesmo informou que desconhecia o agendamento. Data contato: [DATA/HORA]."
-        }]
-    },
-    # 7
-    {
-        "id": "erro_endereco_incorreto",
-        "titulo": "Erro de Agendamento – Endereço incorreto",
-        "acao": "Cancelar agendamento",
-        "quando_usar": "Endereço informado na OS está incorreto ou incompleto, inviabilizando a chegada ao local para execução do serviço.",
-        "exemplos": ["Técnico direcionado para rua X, mas cliente está na rua Y, inviabilizando o atendimento."],
-        "campos": campos("Tipo erro", "Descreva", "Nome", "Data", "Hora"),
-        "mascaras": [{
-            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
-            "template": "Erro identificado no agendamento: [TIPO]. Situação: [DESCREVA]. Cliente [NOME] informado em [DATA/HORA]."
-        }]
-    },
-    # 8
-    {
-        "id": "erro_falta_info_os",
-        "titulo": "Erro de Agendamento – Falta de informações na O.S.",
-        "acao": "Cancelar agendamento",
-        "quando_usar": "OS criada com informações incompletas, como ausência de dados do cliente, tipo de serviço ou outros campos obrigatórios que inviabilizam o atendimento.",
-        "exemplos": ["Não há solução cadastrada no sistema."],
-        "campos": campos("Tipo erro", "Explique", "Nome", "Data", "Hora"),
-        "mascaras": [{
-            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
-            "template": "OS agendada apresentou erro de [TIPO] e foi identificado através de [EXPLIQUE A SITUAÇÃO]. Realizado o contato com o cliente [NOME], no dia [DATA/HORA]."
-        }]
-    },
-    # 9
-    {
-        "id": "erro_os_incorreta",
-        "titulo": "Erro de Agendamento – O.S. agendada incorretamente (tipo/motivo/produto)",
-        "acao": "Cancelar agendamento",
-        "quando_usar": "Erro na categorização do serviço ao agendar a OS (ex: tipo de atendimento ou produto incorreto), levando à impossibilidade de execução correta.",
-        "exemplos": [
-            "1) Cliente pediu assistência e foi agendada instalação por engano.",
-            "2) Agendamento no mesmo dia sem autorização."
-        ],
-        "campos": campos("Tipo erro", "Explique", "Nome", "Data", "Hora"),
-        "mascaras": [{
-            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
-            "template": "OS agendada apresentou erro de [TIPO] e foi identificado através de [EXPLIQUE A SITUAÇÃO]. Realizado o contato com o cliente [NOME], no dia [DATA/HORA]."
-        }]
-    },
-    # 10
-    {
-        "id": "erro_roteirizacao_movel",
-        "titulo": "Erro de roteirização do agendamento - Atendimento móvel",
-        "acao": "Cancelar agendamento",
-        "quando_usar": "Quando houver uma falha no agendamento, e permite que o cliente consiga fazer agendamento no portal do cliente de um dia para o outro ou no mesmo dia, sem considerar o deslocamento.",
-        "exemplos": ["Deslocamento de retorno não considerado, técnico sem tempo hábil para execução, comercial informado."],
-        "campos": campos("Descreber o Problema", "Cliente", "Data", "Hora", "Especialista", "Data", "Hora"),
-        "mascaras": [{
-            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
-            "template": "Não foi possível concluir o atendimento devido [DESCREVER O PROBLEMA]. Cliente [NOME] às [DATA/HORA] foi informado sobre a necessidade de reagendamento. Especialista [ESPECIALISTA] informado às [DATA/HORA 2]."
-        }]
-    },
-    # 11
-    {
-        "id": "falta_acessorios_imobilizado",
-        "titulo": "Falta De Equipamento - Acessórios Imobilizado",
-        "acao": "Cancelar agendamento",
-        "quando_usar": "Falta de acessórios que estão alocados (imobilizados) em outro atendimento, impedindo a realização do serviço agendado.",
-        "exemplos": ["Agendamento precisara ser cancelado, pois estamos sem o sensor temperatura NTC 10K , o mesmo foi pedido para a distribuição mas ainda não chegou."],
-        "campos": campos("Item", "Cliente", "Data", "Hora"),
-        "mascaras": [{
-            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
-            "template": "Atendimento não realizado por falta de [ITEM]. Cliente [NOME] informado em [DATA/HORA]."
-        }]
-    },
-    # 12
-    {
-        "id": "falta_item_reservado_incompativel",
-        "titulo": "Falta De Equipamento - Item Reservado Não Compatível",
-        "acao": "Cancelar agendamento",
-        "quando_usar": "Material reservado está incompatível com o veículo ou serviço solicitado, mesmo estando disponível no estoque.",
-        "exemplos": ["Instalação não concluída por falta de rastreador compatível."],
-        "campos": campos("Item", "Cliente", "Data", "Hora"),
-        "mascaras": [{
-            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
-            "template": "Atendimento não realizado por falta de [ITEM]. Cliente [NOME] informado em [DATA/HORA]."
-        }]
-    },
-    # 13
-    {
-        "id": "falta_material",
-        "titulo": "Falta De Equipamento - Material",
-        "acao": "Cancelar agendamento",
-        "quando_usar": "Ausência total de material necessário para a execução da OS, mesmo após verificação de estoque.",
-        "exemplos": ["Falta equipamento ADPLUS."],
-        "campos": campos("Item", "Cliente", "Data", "Hora"),
-        "mascaras": [{
-            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
-            "template": "Atendimento não realizado por falta de [ITEM]. Cliente [NOME] informado em [DATA/HORA]."
-        }]
-    },
-    # 14
-    {
-        "id": "falta_principal",
-        "titulo": "Falta De Equipamento - Principal",
-        "acao": "Cancelar agendamento",
-        "quando_usar": "Atendimento foi marcado, mas o técnico não tinha consigo o equipamento principal necessário, mesmo estando previsto para o serviço.",
-        "exemplos": [
-            "1) RT Com falta de equipamento LMU4233.​",
-            "2) Aguardando o equipamento RFID."
-        ],
-        "campos": campos("Item", "Cliente", "Data", "Hora"),
-        "mascaras": [{
-            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
-            "template": "Atendimento não realizado por falta de [ITEM]. Cliente [NOME] informado em [DATA/HORA]."
-        }]
-    },
-    # 15
-    {
-        "id": "instabilidade_sistema",
-        "titulo": "Instabilidade de Equipamento/Sistema",
-        "acao": "Contatar a central para conclusão; se não possível, registrar ação com nº da ASM.",
-        "quando_usar": "Quando deu problema no sistema ou no equipamento e não foi possível terminar o serviço.",
-        "exemplos": ["Rastreador não iniciou comunicação com a plataforma."],
-        "campos": campos("Data", "Hora", "Equipamento/Sistema", "Data", "Data", "Hora", "ASM"),
-        "mascaras": [{
-            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
-            "template": (
-                "Atendimento finalizado em [DATA/HORA] não concluído devido à instabilidade de "
-                "[EQUIPAMENTO/SISTEMA]. Registrado teste/reinstalação em [DATA 2]. "
-                "Realizado contato com a central [DATA/HORA 3] e foi gerada a ASM [NÚMERO]."
-            )
-        }]
-    },
-    # 16
-    {
-        "id": "no_show_cliente",
-        "titulo": "No-show Cliente – Ponto Fixo/Móvel",
-        "acao": "Cancelar agendamento",
-        "quando_usar": "Quando o cliente não aparece no local/empresa (fixo) ou não está disponível no ponto móvel.",
-        "exemplos": ["O técnico chegou ao cliente, mas o caminhão estava em rota de viagem, o veículo não compareceu no ponto de atendimento, o veículo chegou com atraso superior a 15 minutos."],
-        "campos": campos("Hora"),
-        "mascaras": [{
-            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
-            "template": "Cliente não compareceu para atendimento até às [HORA]."
-        }]
-    },
-    # 17
-    {
-        "id": "no_show_tecnico",
-        "titulo": "No-show Técnico",
-        "acao": "Cancelar agendamento",
-        "quando_usar": "Quando o técnico não comparece no horário/local.",
-        "exemplos": ["Técnico não realizou o atendimento."],
-        "campos": campos("Nome Técnico", "Data", "Hora", "Motivo"),
-        "mascaras": [{
-            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
-            "template": "Técnico [NOME TÉCNICO], em [DATA/HORA], não realizou o atendimento por motivo de [MOTIVO]."
-        }]
-    },
-    # 18
-    {
-        "id": "oc_tecnico_impossivel",
-        "titulo": "Ocorrência com Técnico – Não foi possível realizar atendimento",
-        "acao": "Cancelar agendamento",
-        "quando_usar": "Quando o técnico não consegue realizar o atendimento por questões pessoais ou operacionais, como: Problemas de saúde e pessoais; Problemas no veículo do técnico ou acidentes, ou outras impossibilidades de comparecer ao local. Deve ser informar horário, nome do cliente e canal de contato (voz, e-mail, whatsapp) que foi informado o cliente sobre a impossibilidade de atendimento.",
-        "exemplos": ["Técnico não se sentiu bem e teve que se ausentar na tarde de hoje."],
-        "campos": campos("Descreber o Problema", "Nome"),
-        "mascaras": [{
-            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
-            "template": "Não foi possível realizar o atendimento devido [DESCREVER O PROBLEMA]. Cliente [NOME] foi informado sobre a necessidade de reagendamento."
-        }]
-    },
-    # 19
-    {
-        "id": "oc_tecnico_parcial",
-        "titulo": "Ocorrência Com Técnico - Sem Tempo Hábil Para Realizar O Serviço (Atendimento Parcial)",
-        "acao": "Cancelar agendamento",
-        "quando_usar": "Quando iniciado o atendimento, porém foi identificado que não será possível concluir o serviço.",
-        "exemplos": ["Técnico começou a realizar o serviço e não conseguiu finalizar o atendimento no mesmo dia."],
-        "campos": campos("Descreber o Problema", "Cliente", "Data", "Hora"),
-        "mascaras": [{
-            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
-            "template": "Não foi possível concluir o atendimento devido [DESCREVER O PROBLEMA]. Cliente [NOME] às [DATA/HORA] foi informado sobre a necessidade de reagendamento."
-        }]
-    },
-    # 20
-    {
-        "id": "oc_tecnico_nao_iniciado",
-        "titulo": "Ocorrência Com Técnico - Sem Tempo Hábil Para Realizar O Serviço (Não iniciado)",
-        "acao": "Cancelar agendamento",
-        "quando_usar": " Quando não houve tempo suficiente por erro de agendamento, encaixe, atraso em OS anterior ou roteirização ruim e o atendimento não foi iniciado.",
-        "exemplos": [" Atendimento anterior demorou muito mais que o previsto e inviabilizou o próximo."],
-        "campos": campos("Motivo", "Cliente"),
-        "mascaras": [{
-            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
-            "template": "Motivo: [MOTIVO]. Cliente [NOME] informado do reagendamento."
-        }]
-    },
-    # 21
-    {
-        "id": "oc_tecnico_sem_habilidade",
-        "titulo": "Ocorrência Com Técnico - Técnico Sem Habilidade Para Realizar Serviço",
-        "acao": "Cancelar agendamento",
-        "quando_usar": "Quando o representante técnico identifica que o atendimento não pode ser realizado, devido a falta de habilidade específica do técnico.",
-        "exemplos": ["Atendimento roteirizado na agenda do técnico instalador sem a habilidade necessária para a realização do serviço"],
-        "campos": campos("Descreber o Problema", "Cliente"),
-        "mascaras": [{
-            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
-            "template": "Não foi possível realizar o atendimento devido [DESCREVER O PROBLEMA]. Cliente [NOME] foi informado sobre a necessidade de reagendamento."
-        }]
-    },
-    # 22
-    {
-        "id": "perda_extravio_defeito",
-        "titulo": "Perda/Extravio/Falta Do Equipamento/Equipamento Com Defeito",
-        "acao": "Cancelar agendamento",
-        "quando_usar": "Quando o técnico identifica que o equipamento/acessório não está mais no veículo ou por falta de condições de mau uso não é possível realizar o atendimento, e o cliente se recusa a assinar o termo de cobrança.",
-        "exemplos": ["Veículo esta no local mas não tem todos os equipamentos, novo proprietário não aceitou assinar o termo de Mau Uso."],
-        "campos": campos("Descreber o Problema"),
-        "mascaras": [{
-            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
-            "template": "Não foi possível realizar o atendimento, pois [DESCREVER PROBLEMA]. Cliente se recusou assinar termo."
-        }]
-    },
-    # 23
-    {
-        "id": "servico_incompativel_os",
-        "titulo": "Serviço incompatível com a OS aberta",
-        "acao": "Cancelar agendamento",
-        "quando_usar": "Quando iniciado o atendimento, porém foi identificado que o equipamento/material separado não atende as necessidades para conclusão do serviço.",
-        "exemplos": ["Técnico foi para atendimento, porém identificou que é necessário utilizar outro equipamento do que foi descrito como problema."],
-        "campos": campos("Descreber o Problema", "Cliente", "Data", "Hora"),
-        "mascaras": [{
-            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
-            "template": "Não foi possível concluir o atendimento devido [DESCREVER O PROBLEMA]. Cliente [NOME] às [DATA/HORA] foi informado sobre a necessidade de reagendamento."
-        }]
-    },
-]
+PREVIA_POR_PAGINA = 50
+
+def _indexar(indice: dict, chave: str, pos: int):
+    if chave:
+        indice.setdefault(chave, []).append(pos)
+
+class IndiceTabela:
+    """
+    Índices secundários (OS, motivo, técnico, data) → posições das linhas em LINHAS.
+    Atualizados a cada linha adicionada; as listas de posições ficam sempre em ordem crescente.
+    """
+
+    def __init__(self, linhas=()):
+        self.por_os = {}
+        self.por_motivo = {}
+        self.por_tecnico = {}
+        self.por_data = {}
+        for pos, linha in enumerate(linhas):
+            self.adicionar(linha, pos)
+
+    @staticmethod
+    def chave(valor) -> str:
+        return str(valor or "").strip().casefold()
+
+    def adicionar(self, linha: Linha, pos: int):
+        _indexar(self.por_os, self.chave(linha.os), pos)
+        _indexar(self.por_motivo, linha.motivo_id, pos)
+        for nome, valor in zip(NOMES_EFETIVOS[linha.motivo_id], linha.valores):
+            if nome == "nome_tecnico":
+                _indexar(self.por_tecnico, self.chave(valor), pos)
+            elif re.match(r"^data(?:_\d+)?$", nome):
+                _indexar(self.por_data, self.chave(valor), pos)
+
+    def buscar(self, os="", motivo_id="", tecnico="", data=""):
+        """Posições que atendem a todos os filtros informados, em ordem; None se nenhum filtro foi informado."""
+        filtros = ((self.por_os, self.chave(os)), (self.por_motivo, motivo_id),
+                   (self.por_tecnico, self.chave(tecnico)), (self.por_data, self.chave(data)))
+        listas = [indice.get(chave, []) for indice, chave in filtros if chave]
+        if not listas:
+            return None
+        if len(listas) == 1:
+            return listas[0]
+        listas.sort(key=len)
+        comuns = set(listas[0]).intersection(*listas[1:])
+        return [p for p in listas[0] if p in comuns]
+
+def adicionar_linhas(linhas):
+    """Acrescenta linhas à tabela, atualizando os índices e a versão da tabela."""
+    base = len(st.session_state.LINHAS)
+    st.session_state.LINHAS.extend(linhas)
+    for pos, linha in enumerate(linhas, base):
+        st.session_state.INDICE.adicionar(linha, pos)
+    marcar_tabela_alterada()
 
 # =========================================================
-# AUTO-FIX DE TOKENS DO CATÁLOGO (blindagem)
+# Exportação (cache versionado por tabela, LRU entre sessões)
 # =========================================================
-import copy
-
-# tokens canônicos (para reescrita “visual” nos templates)
-CANON_EQUIV = {
-    "NOME": "nome",
-    "NOME CLIENTE": "nome",
-    "CLIENTE": "nome",
-    "NOME TÉCNICO": "nome_tecnico",
-    "TÉCNICO": "nome_tecnico",
-    "CANAL": "canal",
-    "ESPECIALISTA": "especialista",
-    "TIPO": "tipo_erro",
-    "EXPLIQUE A SITUAÇÃO": "explique",
-    "EQUIPAMENTO/SISTEMA": "equipamento_sistema",
-    "ITEM": "item",
-    "MOTIVO": "motivo",
-    "NÚMERO ORDEM DE SERVIÇO": "numero_os",
-    "NÚMERO": "asm",
-    "DATA": "data",
-    "HORA": "hora",
-    "DATA/HORA": "__DATAHORA__",
+EXPORT_CACHE_MAX_BYTES = 64 * 1024 * 1024  # teto de memória do cache (todas as sessões)
+EXPORT_MAX_WORKERS = int(os.environ.get("NO_SHOW_EXPORT_WORKERS", "2"))  # threads de exportação (todas as sessões)
+EXPORT_CHUNK_LINHAS = 2000  # linhas por bloco (granularidade do progresso/cancelamento)
+
+EXPORT_MIME = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
 }
 
-def _token_guess(tok_raw: str):
-    """Deduz um token canônico textual para reescrita no template."""
-    t = slug(tok_raw)
-
-    # pares DATA/HORA com índice
-    m = re.match(r"^data_hora(?:_(\d+))?$", t)
-    if m:
-        idx = m.group(1)
-        return "DATA/HORA" if not idx or idx == "1" else f"DATA/HORA {idx}"
-
-    # data/hora isolados com índice
-    m = re.match(r"^(data|hora)(?:_(\d+))?$", t)
-    if m:
-        base, idx = m.group(1), m.group(2)
-        base_up = "DATA" if base == "data" else "HORA"
-        return base_up if not idx or idx == "1" else f"{base_up} {idx}"
-
-    # nomes
-    if "cliente" in t or t == "nome":
-        return "NOME"
-    if "tecnico" in t:
-        return "NOME TÉCNICO"
-
-    # termos comuns
-    if "canal" in t: return "CANAL"
-    if "especial" in t: return "ESPECIALISTA"
-    if "equipamento" in t or "sistema" in t: return "EQUIPAMENTO/SISTEMA"
-    if "motivo" in t: return "MOTIVO"
-    if t.startswith("tipo"): return "TIPO"
-    if "explique" in t or "situacao" in t: return "EXPLIQUE A SITUAÇÃO"
-    if "item" in t: return "ITEM"
-    if "numero_ordem" in t or t == "numero_os": return "NÚMERO ORDEM DE SERVIÇO"
-    if t == "numero": return "NÚMERO"
-
-    # problema / descrever
-    if "descr" in t and "problem" in t:
-        return "DESCREVER O PROBLEMA"
-
-    return None
-
-def aplicar_auto_fix_catalogo(catalogo):
-    cat = copy.deepcopy(catalogo)
-    fixes = []
-    for m in cat:
-        for mask in m.get("mascaras", []):
-            tpl = str(mask.get("template", ""))
-            tokens = re.findall(r"\[([^\]]+)\]", tpl)
-            for tok in tokens:
-                # se normalize_token já resolve, deixa como está
-                if normalize_token(tok) != slug(tok):
-                    continue
-                guess = _token_guess(tok)
-                if not guess:
+class CacheExportacao:
+    """LRU de arquivos exportados, limitado pelo total de bytes e compartilhado entre sessões."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total = 0
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            data = self._itens.get(chave)
+            if data is not None:
+                self._itens.move_to_end(chave)
+            return data
+
+    def guardar(self, chave, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            antigo = self._itens.pop(chave, None)
+            if antigo is not None:
+                self.total -= len(antigo)
+            self._itens[chave] = data
+            self.total += len(data)
+            while self.total > self.max_bytes:
+                _, removido = self._itens.popitem(last=False)
+                self.total -= len(removido)
+
+    def descartar_sessao(self, sessao_id: str):
+        """Remove os arquivos de uma sessão (tabela mudou, versões antigas não servem mais)."""
+        with self._lock:
+            for chave in [k for k in self._itens if k[0] == sessao_id]:
+                self.total -= len(self._itens.pop(chave))
+
+@st.cache_resource
+def cache_exportacao() -> CacheExportacao:
+    return CacheExportacao(EXPORT_CACHE_MAX_BYTES)
+
+@st.cache_resource
+def pool_exportacao() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=EXPORT_MAX_WORKERS, thread_name_prefix="no_show_export")
+
+def marcar_tabela_alterada():
+    """Avança a versão da tabela, cancela a exportação em andamento e invalida o cache desta sessão."""
+    st.session_state.TABELA_VERSAO = st.session_state.get("TABELA_VERSAO", 0) + 1
+    job = st.session_state.pop("EXPORT_JOB", None)
+    if job is not None:
+        job.cancelar.set()
+    if "SESSAO_ID" in st.session_state:
+        cache_exportacao().descartar_sessao(st.session_state.SESSAO_ID)
+
+def excel_engine():
+    """Engine Excel disponível (openpyxl ou xlsxwriter), ou None."""
+    try:
+        import openpyxl  # noqa: F401
+        return "openpyxl"
+    except Exception:
+        try:
+            import xlsxwriter  # noqa: F401
+            return "xlsxwriter"
+        except Exception:
+            return None
+
+class JobCancelado(Exception):
+    """Job em segundo plano (exportação/lote) interrompido pelo botão de cancelar."""
+
+def gerar_exportacao(linhas, formato: str, progresso=None, cancelado=None) -> bytes:
+    """
+    Serializa a tabela no formato pedido ("xlsx" ou "csv"), em blocos de EXPORT_CHUNK_LINHAS.
+    `progresso(n)` é chamado com o total de linhas já escritas; se o evento `cancelado`
+    for acionado, a exportação para no próximo bloco com JobCancelado.
+    """
+    if formato not in EXPORT_MIME:
+        raise ValueError(f"Formato de exportação desconhecido: {formato}")
+    colunas = colunas_tabela(linhas)
+    if formato == "xlsx":
+        buf = io.BytesIO()
+        writer = pd.ExcelWriter(buf, engine=excel_engine())
+    else:
+        buf = io.StringIO()
+        writer = None
+    # tabela vazia ainda passa uma vez pelo laço para gravar o cabeçalho
+    for inicio in range(0, max(len(linhas), 1), EXPORT_CHUNK_LINHAS):
+        if cancelado is not None and cancelado.is_set():
+            raise JobCancelado()  # o buffer é descartado, não precisa fechar o writer
+        bloco = linhas_para_df(linhas[inicio:inicio + EXPORT_CHUNK_LINHAS]).reindex(columns=colunas)
+        if writer is not None:
+            bloco.to_excel(writer, index=False, sheet_name="No-show",
+                           header=inicio == 0, startrow=inicio + 1 if inicio else 0)
+        else:
+            bloco.to_csv(buf, index=False, header=inicio == 0)
+        if progresso is not None:
+            progresso(inicio + len(bloco))
+    if writer is not None:
+        writer.close()
+        return buf.getvalue()
+    return buf.getvalue().encode("utf-8-sig")
+
+class JobExportacao:
+    """Exportação rodando no pool compartilhado: progresso (linhas escritas / total) e cancelamento."""
+
+    def __init__(self, chave, total: int):
+        self.chave = chave
+        self.formato = chave[2]
+        self.total = total
+        self.escritas = 0
+        self.cancelar = threading.Event()
+        self.cancelada = False
+        self.future = None
+
+    def _progresso(self, n: int):
+        self.escritas = n
+
+    def rodar(self, linhas, cache: CacheExportacao) -> bytes:
+        try:
+            data = gerar_exportacao(linhas, self.formato, progresso=self._progresso, cancelado=self.cancelar)
+            if self.cancelar.is_set():
+                # cancelado depois do último bloco: bytes de uma versão descartada não voltam ao cache
+                raise JobCancelado()
+        except JobCancelado:
+            self.cancelada = True
+            raise
+        cache.guardar(self.chave, data)
+        return data
+
+def iniciar_exportacao(formato: str) -> JobExportacao:
+    """Exporta a tabela atual em segundo plano; se já houver o arquivo em cache, o job nasce concluído."""
+    linhas = list(st.session_state.LINHAS)
+    chave = (st.session_state.SESSAO_ID, st.session_state.TABELA_VERSAO, formato)
+    job = JobExportacao(chave, len(linhas))
+    cache = cache_exportacao()
+    data = cache.obter(chave)
+    if data is not None:
+        job.escritas = job.total
+        job.future = Future()
+        job.future.set_result(data)
+    else:
+        job.future = pool_exportacao().submit(job.rodar, linhas, cache)
+    return job
+
+@st.fragment(run_every=1.0)
+def painel_exportacao_em_andamento(job: JobExportacao):
+    """Barra de progresso atualizada sozinha; ao terminar, recarrega a página para exibir o download."""
+    if job.future.done():
+        st.rerun()
+    st.progress(job.escritas / max(job.total, 1), text=f"Exportando… {job.escritas}/{job.total} linhas")
+    if st.button("Cancelar exportação"):
+        job.cancelar.set()
+
+def mostrar_exportacao(job: JobExportacao):
+    """Progresso do job em andamento, ou o botão de download quando ele termina."""
+    if not job.future.done():
+        painel_exportacao_em_andamento(job)
+        return
+    erro = job.future.exception()
+    if erro is not None:
+        del st.session_state.EXPORT_JOB
+        # o job pode ter sido criado em outra execução do script (outra classe JobCancelado),
+        # então o cancelamento é lido do próprio job e não por isinstance
+        if job.cancelada:
+            st.info("Exportação cancelada.")
+        else:
+            st.error(f"Falha ao gerar o arquivo: {erro}")
+        return
+    nome = f"no_show_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{job.formato}"
+    if job.formato == "xlsx":
+        st.download_button("Baixar Excel (No-show)", data=job.future.result(),
+                           file_name=nome, mime=EXPORT_MIME["xlsx"])
+        st.caption(f"Arquivo gerado com engine **{excel_engine()}**.")
+    else:
+        st.download_button("Baixar CSV (fallback)", data=job.future.result(),
+                           file_name=nome, mime=EXPORT_MIME["csv"])
+        st.warning("Nenhum engine Excel disponível. Exporte em CSV ou inclua `openpyxl`/`xlsxwriter` no requirements.")
+
+# =========================================================
+# Importação (retomar a partir de planilha exportada)
+# =========================================================
+IMPORT_MAX_ERROS_EXIBIDOS = 20
+
+def chave_linha(linha: Linha) -> tuple:
+    """Identidade da linha para detectar duplicadas."""
+    return (linha.motivo_id, linha.alt_id, linha.os, linha.valores, linha.mascara)
+
+def importar_planilha(arquivo, nome: str, existentes):
+    """
+    Converte uma planilha exportada pelo app de volta em linhas da tabela.
+    Motivo e versão da máscara são mapeados pelo catálogo e os campos pelos rótulos das colunas.
+    Retorna (novas, erros, duplicadas): linhas válidas e inéditas, mensagens das linhas
+    rejeitadas e quantas linhas já estavam na tabela (ou repetidas no próprio arquivo).
+    """
+    novas, erros, duplicadas = [], [], 0
+    linhas = iterar_planilha(arquivo, nome)
+    cabecalho = next(linhas, None)
+    if not cabecalho:
+        return novas, ["Arquivo vazio."], duplicadas
+    mapa = MapaColunas(cabecalho)
+    if "Motivo" not in mapa.col:
+        return novas, ["Coluna **Motivo** não encontrada; use uma planilha exportada pelo app."], duplicadas
+
+    vistos = {chave_linha(l) for l in existentes}
+    for n, row in enumerate(linhas, start=2):
+        if not any(texto_celula(v) for v in row):
+            continue
+        motivo_id, alt_id, valores, erro = mapa.ler(row)
+        if erro:
+            erros.append(f"Linha {n}: {erro}.")
+            continue
+        mascara = mapa.cel(row, "Máscara")
+        if not mascara:
+            mascara = build_mask(ALTERNATIVAS_POR_ID[(motivo_id, alt_id)].get("template", ""),
+                                 aplicar_aliases(dict(zip(NOMES_EFETIVOS[motivo_id], valores))))
+        linha = Linha(motivo_id, alt_id, mapa.cel(row, "Número OS (consulta)"), valores, mascara)
+        chave = chave_linha(linha)
+        if chave in vistos:
+            duplicadas += 1
+            continue
+        vistos.add(chave)
+        novas.append(linha)
+    return novas, erros, duplicadas
+
+# =========================================================
+# Processamento em lote (planilha enviada por supervisores)
+# =========================================================
+LOTE_MAX_WORKERS = int(os.environ.get("NO_SHOW_LOTE_WORKERS", "2"))  # lotes simultâneos (todas as sessões)
+LOTE_PROCESSOS = int(os.environ.get("NO_SHOW_LOTE_PROCESSOS", str(min(4, os.cpu_count() or 1))))  # processos de cálculo
+LOTE_CHUNK_LINHAS = 5000  # linhas por bloco (memória, progresso e cancelamento)
+LOTE_BLOCOS_PENDENTES = 2 * LOTE_PROCESSOS  # blocos enviados e ainda não gravados, por lote (teto de memória)
+LOTE_PREVIA_LINHAS = 50
+LOTE_TIMEOUT_BLOCO = float(os.environ.get("NO_SHOW_LOTE_TIMEOUT", "600"))  # segundos de espera por bloco/conversão
+
+@st.cache_resource
+def pool_lote() -> ThreadPoolExecutor:
+    """Threads que coordenam cada lote (leitura, envio dos blocos, gravação); o cálculo fica nos processos."""
+    return ThreadPoolExecutor(max_workers=LOTE_MAX_WORKERS, thread_name_prefix="no_show_lote")
+
+@st.cache_resource(validate=lambda pool: not getattr(pool, "_broken", False))
+def pool_processos_lote():
+    """
+    Processos que validam e geram as máscaras dos blocos, fora do GIL do servidor.
+    Usa "fork": o filho herda o no_show_catalogo já importado. Com "spawn"/"forkserver" o multiprocessing
+    reexecutaria este script (o __main__ do Streamlit) em cada processo. Fork só no Linux (no macOS o fork
+    de um processo com threads não é seguro); nos demais sistemas, usa threads.
+    """
+    if not sys.platform.startswith("linux"):
+        return ThreadPoolExecutor(max_workers=LOTE_PROCESSOS, thread_name_prefix="no_show_lote_calc")
+    return ProcessPoolExecutor(max_workers=LOTE_PROCESSOS, mp_context=multiprocessing.get_context("fork"))
+
+def estimar_linhas(data: bytes, nome: str) -> int:
+    """Quantidade aproximada de linhas de dados, sem ler a planilha inteira (só para o progresso)."""
+    if nome.lower().endswith(".csv"):
+        return max(data.count(b"\n") - 1, 0)
+    import openpyxl
+    wb = openpyxl.load_workbook(io.BytesIO(data), read_only=True)
+    try:
+        ws = wb["No-show"] if "No-show" in wb.sheetnames else wb.worksheets[0]
+        return max((ws.max_row or 1) - 1, 0)
+    finally:
+        wb.close()
+
+class JobLote:
+    """
+    Processamento de planilha em segundo plano: uma thread coordena (lê em blocos, envia aos processos,
+    grava o CSV em ordem) e expõe progresso, prévia parcial e cancelamento.
+    """
+
+    def __init__(self, nome: str, total: int):
+        self.nome = nome
+        self.total = total
+        self.etapa = "Na fila…"
+        self.processadas = 0
+        self.com_erro = 0
+        self.previa = None
+        self.cancelar = threading.Event()
+        self.cancelada = False
+        self.future = None
+
+    def rodar(self, data: bytes) -> bytes:
+        try:
+            return self._processar(data)
+        except JobCancelado:
+            self.cancelada = True
+            raise
+
+    def _aguardar(self, fut):
+        """Resultado de um bloco enviado aos processos, atendendo ao cancelamento e ao LOTE_TIMEOUT_BLOCO."""
+        limite = time.monotonic() + LOTE_TIMEOUT_BLOCO
+        while True:
+            if self.cancelar.is_set():
+                raise JobCancelado()
+            try:
+                return fut.result(timeout=0.2)
+            except TimeoutError:
+                if time.monotonic() < limite:
                     continue
-                # normaliza sinônimos para um único canônico “visual”
-                if guess in ("NOME CLIENTE", "CLIENTE"):
-                    guess = "NOME"
-                if guess != tok:
-                    tpl_new = tpl.replace(f"[{tok}]", f"[{guess}]")
-                    if tpl_new != tpl:
-                        fixes.append(f'{m["id"]}: [{tok}] → [{guess}]')
-                        tpl = tpl_new
-            mask["template"] = tpl
-    if fixes:
-        st.info("Ajustes automáticos de tokens aplicados:\n- " + "\n- ".join(fixes))
-    return cat
-
-CATALOGO = aplicar_auto_fix_catalogo(CATALOGO)
+            # processo travado: os próximos lotes recebem um pool novo em vez de esperar na fila dele
+            pool_processos_lote.clear()
+            raise TimeoutError(f"um bloco ficou sem resposta por {LOTE_TIMEOUT_BLOCO:.0f}s.")
+
+    def _processar(self, data: bytes) -> bytes:
+        pool = pool_processos_lote()
+        if not self.nome.lower().endswith(".csv"):
+            # openpyxl é o trecho mais pesado: a conversão para CSV também roda num processo
+            self.etapa = "Lendo planilha…"
+            data = self._aguardar(pool.submit(xlsx_para_csv, data))
+        self.etapa = "Processando…"
+        # csv.reader aceita linhas com qualquer nº de colunas: as malformadas vão para "Erros" em vez de abortar o lote
+        encoding, separador = formato_csv(data)
+        texto = io.TextIOWrapper(io.BytesIO(data), encoding=encoding, errors="replace", newline="")
+        leitor = csv.reader(texto, delimiter=separador)
+        cabecalho = next(leitor, None)
+        if cabecalho is None:
+            raise ValueError("Arquivo vazio.")
+        cabecalho = tuple(texto_celula(v) for v in cabecalho)
+        if "Motivo" not in MapaColunas(cabecalho).col:
+            raise ValueError("Coluna **Motivo** não encontrada.")
+
+        # resultado vai direto para CSV, bloco a bloco e na ordem da planilha; só a prévia fica como DataFrame
+        buf = io.BytesIO()
+        buf.write(pd.DataFrame(columns=colunas_resultado(cabecalho)).to_csv(index=False).encode("utf-8-sig"))
+        primeira = 2  # o cabeçalho é a linha 1
+        pendentes = deque()
+        try:
+            while True:
+                bloco = list(islice(leitor, LOTE_CHUNK_LINHAS))
+                if not bloco:
+                    break
+                if self.cancelar.is_set():
+                    raise JobCancelado()
+                pendentes.append(pool.submit(processar_bloco_lote, cabecalho, primeira, bloco, LOTE_PREVIA_LINHAS))
+                primeira += len(bloco)
+                if len(pendentes) >= LOTE_BLOCOS_PENDENTES:
+                    self._escrever(buf, self._aguardar(pendentes.popleft()))
+            while pendentes:
+                self._escrever(buf, self._aguardar(pendentes.popleft()))
+        finally:
+            for fut in pendentes:
+                fut.cancel()
+        return buf.getvalue()
+
+    def _escrever(self, buf, resultado):
+        csv_bloco, processadas, com_erro, previa = resultado
+        buf.write(csv_bloco)
+        if self.previa is None or len(self.previa) < LOTE_PREVIA_LINHAS:
+            self.previa = pd.concat([self.previa, previa]).head(LOTE_PREVIA_LINHAS)
+        self.com_erro += com_erro
+        self.processadas += processadas
+
+def iniciar_lote(arquivo) -> JobLote:
+    """Envia a planilha para o pool de processamento em lote."""
+    data = arquivo.getvalue()
+    job = JobLote(arquivo.name, estimar_linhas(data, arquivo.name))
+    job.future = pool_lote().submit(job.rodar, data)
+    return job
+
+@st.fragment(run_every=1.0)
+def painel_lote_em_andamento(job: JobLote):
+    """Progresso e prévia parcial atualizados sozinhos; ao terminar, recarrega a página para exibir o download."""
+    if job.future.done():
+        st.rerun()
+    total = max(job.total, job.processadas, 1)
+    st.progress(job.processadas / total, text=f"{job.etapa} {job.processadas}/{total} linhas ({job.com_erro} com erro)")
+    if st.button("Cancelar processamento"):
+        job.cancelar.set()
+    if job.previa is not None:
+        st.dataframe(job.previa, use_container_width=True)
+
+def mostrar_lote(job: JobLote):
+    """Progresso do lote em andamento, ou o resumo e o download do resultado quando ele termina."""
+    if not job.future.done():
+        painel_lote_em_andamento(job)
+        return
+    erro = job.future.exception()
+    if erro is not None:
+        del st.session_state.LOTE_JOB
+        if job.cancelada:  # não usa isinstance: o job pode vir de outra execução do script
+            st.info("Processamento cancelado.")
+        else:
+            st.error(f"Falha ao processar a planilha: {erro}")
+        return
+    st.success(f"{job.processadas} linha(s) processada(s); {job.com_erro} com erro (ver coluna **Erros**).")
+    st.download_button(
+        "Baixar resultado (CSV)",
+        data=job.future.result(),
+        file_name=f"no_show_lote_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+        mime=EXPORT_MIME["csv"]
+    )
+    if job.previa is not None:
+        st.dataframe(job.previa, use_container_width=True)
 
 # =========================================================
 # Estado
@@ -631,16 +576,31 @@ if "LINHAS" not in st.session_state:
     st.session_state.LINHAS = []
 if "reset_token" not in st.session_state:
     st.session_state.reset_token = 0
+if "INDICE" not in st.session_state:
+    st.session_state.INDICE = IndiceTabela(st.session_state.LINHAS)
+if "IMPORT_TOKEN" not in st.session_state:
+    st.session_state.IMPORT_TOKEN = 0
+if "LOTE_TOKEN" not in st.session_state:
+    st.session_state.LOTE_TOKEN = 0
+if "SESSAO_ID" not in st.session_state:
+    st.session_state.SESSAO_ID = uuid.uuid4().hex
+if "TABELA_VERSAO" not in st.session_state:
+    st.session_state.TABELA_VERSAO = 0
 
 # =========================================================
 # UI principal
 # =========================================================
 st.markdown("**Ferramenta para identificar como classificar No-show.**")
 
-os_consulta = st.text_input(
-    "Número da OS (opcional) — podem deixar em branco",
-    key=f"os_consulta_{st.session_state.reset_token}"
-).strip()
+@st.fragment
+def campo_os():
+    """Número da OS em fragmento próprio: digitar aqui não recarrega o resto da página."""
+    st.text_input(
+        "Número da OS (opcional) — podem deixar em branco",
+        key=f"os_consulta_{st.session_state.reset_token}"
+    )
+
+campo_os()
 
 st.markdown("**1. Motivos – selecionar um aqui:**")
 motivos_map = {m["titulo"]: m for m in CATALOGO}
@@ -653,11 +613,13 @@ motivo_titulo = st.selectbox(
 )
 motivo = motivos_map[motivo_titulo]
 
-st.markdown("**2. Preencher as informações solicitadas.**")
-col_esq, col_dir = st.columns([1.05, 1])
-
-with col_esq:
-    st.subheader("Dados")
+@st.fragment
+def secao_dados(motivo):
+    """
+    Inputs, máscara e botões. Roda como fragmento: editar um campo reexecuta só
+    esta seção (e o build_mask); ações que mudam a tabela recarregam a página toda.
+    """
+    os_consulta = st.session_state.get(f"os_consulta_{st.session_state.reset_token}", "").strip()
 
     # opções de máscara
     alt_labels = [a["rotulo"] for a in motivo["mascaras"]]
@@ -720,11 +682,7 @@ with col_esq:
             erros.append(f"Preencha o campo obrigatório: **{pretty_label}**")
 
     # aliases de campos p/ máscara
-    if not valores.get("nome"):
-        for k in ("cliente", "nome_cliente"):
-            if valores.get(k):
-                valores["nome"] = valores[k]
-                break
+    aplicar_aliases(valores)
 
     # máscara gerada
     template = alternativa.get("template", "")
@@ -749,73 +707,32 @@ with col_esq:
     limpar_campos_btn = c4.button("🧹 Limpar campos")
     limpar_tabela_btn = c5.button("🗑️ Limpar tabela")
 
+    aviso = st.session_state.pop("AVISO", None)
+    if aviso:
+        st.success(aviso)
+
     if add:
         if erros:
             for e in erros:
                 st.warning(e)
         else:
-            registro = {
-                "Número OS (consulta)": os_consulta,
-                "Motivo": motivo["titulo"],
-                "Versão máscara": alternativa["rotulo"],
-                "Ação sistêmica": motivo.get("acao", ""),
-                "Quando usar": motivo.get("quando_usar", ""),
-                "Máscara": mascara_editada,
-            }
-            # incluir campos preenchidos
-            counts_by_name = {}
-            counts_by_label = {}
-            for idx, c in enumerate(motivo["campos"]):
-                base_name = c["name"]; label = c["label"]
-                occ = counts_by_name.get(base_name, 0) + 1
-                counts_by_name[base_name] = occ
-                eff_name = base_name if occ == 1 else f"{base_name}_{occ}"
-
-                occ_label = counts_by_label.get(label, 0) + 1
-                counts_by_label[label] = occ_label
-                col_label = label if occ_label == 1 else f"{label} {occ_label}"
-
-                registro[col_label] = valores.get(eff_name, "")
-
-            st.session_state.LINHAS.append(registro)
-            st.success("Linha adicionada.")
+            linha = Linha(
+                motivo["id"],
+                alternativa["id"],
+                os_consulta,
+                tuple(valores.get(n, "") for n in nomes_efetivos(motivo)),
+                mascara_editada,
+            )
+            adicionar_linhas([linha])
+            st.session_state.AVISO = "Linha adicionada."
+            st.rerun()
 
     if baixar:
-        df = pd.DataFrame(st.session_state.LINHAS) if st.session_state.LINHAS else pd.DataFrame()
-        if df.empty:
+        if not st.session_state.LINHAS:
             st.info("Nada para exportar ainda.")
         else:
-            engine = None
-            try:
-                import openpyxl  # noqa: F401
-                engine = "openpyxl"
-            except Exception:
-                try:
-                    import xlsxwriter  # noqa: F401
-                    engine = "xlsxwriter"
-                except Exception:
-                    engine = None
-
-            if engine:
-                buf = io.BytesIO()
-                with pd.ExcelWriter(buf, engine=engine) as w:
-                    df.to_excel(w, index=False, sheet_name="No-show")
-                st.download_button(
-                    "Baixar Excel (No-show)",
-                    data=buf.getvalue(),
-                    file_name=f"no_show_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
-                st.caption(f"Arquivo gerado com engine **{engine}**.")
-            else:
-                csv = df.to_csv(index=False).encode("utf-8-sig")
-                st.download_button(
-                    "Baixar CSV (fallback)",
-                    data=csv,
-                    file_name=f"no_show_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                    mime="text/csv"
-                )
-                st.warning("Nenhum engine Excel disponível. Exporte em CSV ou inclua `openpyxl`/`xlsxwriter` no requirements.")
+            st.session_state.EXPORT_JOB = iniciar_exportacao("xlsx" if excel_engine() else "csv")
+            st.rerun()
 
     if limpar_campos_btn:
         limpar_campos()
@@ -823,7 +740,94 @@ with col_esq:
 
     if limpar_tabela_btn:
         limpar_tabela()
-        st.success("Tabela limpa.")
+        st.session_state.AVISO = "Tabela limpa."
+        st.rerun()
+
+@st.fragment
+def secao_previa():
+    """Filtro por OS/motivo/técnico/data (consulta os índices) e prévia paginada só das linhas encontradas."""
+    f1, f2, f3, f4 = st.columns([1, 2, 1, 1])
+    filtro_os = f1.text_input("Filtrar por OS", key="filtro_os")
+    filtro_motivo = f2.selectbox(
+        "Filtrar por motivo",
+        [""] + list(CATALOGO_POR_ID),
+        format_func=lambda i: CATALOGO_POR_ID[i]["titulo"] if i else "Todos",
+        key="filtro_motivo"
+    )
+    filtro_tecnico = f3.text_input("Filtrar por técnico", key="filtro_tecnico")
+    filtro_data = f4.text_input("Filtrar por data", key="filtro_data")
+
+    linhas = st.session_state.LINHAS
+    posicoes = st.session_state.INDICE.buscar(filtro_os, filtro_motivo, filtro_tecnico, filtro_data)
+    total = len(linhas) if posicoes is None else len(posicoes)
+    paginas = max(1, -(-total // PREVIA_POR_PAGINA))
+    # sem filtro a prévia abre na última página, onde aparecem as linhas recém-adicionadas/importadas
+    pagina = paginas if posicoes is None else 1
+    if paginas > 1:
+        pagina = st.number_input(
+            "Página", min_value=1, max_value=paginas, value=pagina,
+            key=f"filtro_pagina_{paginas}_{posicoes is None}"
+        )
+    inicio = (pagina - 1) * PREVIA_POR_PAGINA
+    if posicoes is None:
+        exibidas = range(inicio, min(inicio + PREVIA_POR_PAGINA, total))
+    else:
+        exibidas = posicoes[inicio:inicio + PREVIA_POR_PAGINA]
+
+    df_prev = linhas_para_df([linhas[i] for i in exibidas])
+    df_prev.index = list(exibidas)
+    if posicoes is not None:
+        st.caption(f"{total} de {len(linhas)} linha(s) encontradas.")
+    st.dataframe(df_prev, use_container_width=True)
+
+@st.fragment
+def secao_importar():
+    """Retomar o trabalho: importa uma planilha exportada (xlsx/csv) de volta para a tabela."""
+    resultado = st.session_state.pop("RESULTADO_IMPORTACAO", None)
+    with st.expander("Retomar trabalho: importar planilha exportada (.xlsx/.csv)", expanded=resultado is not None):
+        arquivo = st.file_uploader(
+            "Planilha exportada pelo app",
+            type=["xlsx", "csv"],
+            key=f"importar_{st.session_state.IMPORT_TOKEN}"
+        )
+        if arquivo is not None and st.button("Importar para a tabela"):
+            novas, erros, duplicadas = importar_planilha(arquivo, arquivo.name, st.session_state.LINHAS)
+            if novas:
+                adicionar_linhas(novas)
+            st.session_state.RESULTADO_IMPORTACAO = (len(novas), duplicadas, erros)
+            st.session_state.IMPORT_TOKEN += 1
+            st.rerun()
+
+        if resultado is not None:
+            importadas, duplicadas, erros = resultado
+            st.success(f"{importadas} linha(s) importada(s); {duplicadas} duplicada(s) ignorada(s).")
+            if erros:
+                st.warning(f"{len(erros)} linha(s) rejeitada(s):\n- "
+                           + "\n- ".join(erros[:IMPORT_MAX_ERROS_EXIBIDOS])
+                           + ("\n- …" if len(erros) > IMPORT_MAX_ERROS_EXIBIDOS else ""))
+
+@st.fragment
+def secao_lote_envio():
+    """Envio da planilha de OS para processamento em lote (máscaras + validação)."""
+    st.caption("Colunas esperadas: **Motivo** (título ou id), **Versão máscara** (se o motivo tiver mais de uma) "
+               "e os campos com os mesmos rótulos da tabela (ex.: Cliente, Data, Hora, Data 2…).")
+    arquivo = st.file_uploader("Planilha de OS", type=["xlsx", "csv"], key=f"lote_{st.session_state.LOTE_TOKEN}")
+    if arquivo is not None and st.button("Processar planilha"):
+        job = st.session_state.pop("LOTE_JOB", None)
+        if job is not None:
+            job.cancelar.set()
+        st.session_state.LOTE_JOB = iniciar_lote(arquivo)
+        st.session_state.LOTE_TOKEN += 1
+        st.rerun()
+
+st.markdown("**2. Preencher as informações solicitadas.**")
+col_esq, col_dir = st.columns([1.05, 1])
+
+with col_esq:
+    st.subheader("Dados")
+    secao_dados(motivo)
+    if "EXPORT_JOB" in st.session_state:
+        mostrar_exportacao(st.session_state.EXPORT_JOB)
 
 with col_dir:
     st.subheader("O que fazer?")
@@ -838,6 +842,10 @@ with col_dir:
         st.caption("Sem exemplos cadastrados.")
 
 st.markdown("---")
+secao_importar()
+with st.expander("Processar planilha em lote (gera máscaras para várias OS)", expanded="LOTE_JOB" in st.session_state):
+    secao_lote_envio()
+    if "LOTE_JOB" in st.session_state:
+        mostrar_lote(st.session_state.LOTE_JOB)
 st.subheader("Prévia da tabela")
-df_prev = pd.DataFrame(st.session_state.LINHAS) if st.session_state.LINHAS else pd.DataFrame()
-st.dataframe(df_prev, use_container_width=True)
+secao_previa()
@@ -0,0 +1,873 @@
+# -*- coding: utf-8 -*-
+# no_show_catalogo.py
+#
+# Catálogo de motivos, geração de máscaras e leitura de planilhas.
+# Não depende do Streamlit: é importado pelo app e pelos processos do lote.
+
+import io
+import re
+import csv
+import copy
+import codecs
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+# =========================================================
+# Helpers
+# =========================================================
+def slug(s: str) -> str:
+    s = re.sub(r"[^0-9a-zA-ZÀ-ÿ/ _-]+", "", str(s or ""))
+    s = s.strip().lower()
+    s = (s.replace("ç","c").replace("á","a").replace("à","a").replace("â","a").replace("ã","a")
+           .replace("é","e").replace("ê","e").replace("í","i")
+           .replace("ó","o").replace("ô","o").replace("õ","o")
+           .replace("ú","u").replace("ü","u"))
+    s = s.replace("/", "_")
+    s = re.sub(r"[^\w]+", "_", s)
+    s = re.sub(r"_+", "_", s)
+    return s.strip("_")
+
+def normalize_token(token: str) -> str:
+    """
+    Normaliza os [TOKENS] do catálogo para chaves de campos.
+    Suporta sufixos numéricos: [DATA 2], [HORA 3], [DATA/HORA 2], etc.
+    Retorna uma chave conhecida OU o próprio slug(token) se não houver mapeamento.
+    """
+    t = slug(token)
+
+    # Descrever problema
+    if ("descr" in t) and ("problem" in t):
+        return "descreber_o_problema"
+
+    # DATA/HORA 1..N
+    m = re.match(r"^data_hora(?:_(\d+))?$", t)
+    if m:
+        n = m.group(1)
+        if not n or n == "1":
+            return "__DATAHORA__"
+        if n == "2":
+            return "__DATAHORA2__"
+        if n == "3":
+            return "__DATAHORA3__"
+        return f"__DATAHORA{n}__"
+
+    # DATA 1..N
+    m = re.match(r"^data(?:_(\d+))?$", t)
+    if m:
+        n = m.group(1)
+        return f"data_{n}" if n and n != "1" else "data"
+
+    # HORA 1..N
+    m = re.match(r"^hora(?:_(\d+))?$", t)
+    if m:
+        n = m.group(1)
+        return f"hora_{n}" if n and n != "1" else "hora"
+
+    # Mapeamentos diretos / sinônimos
+    mapping = {
+        # nomes
+        "nome": "nome",
+        "cliente": "nome",
+        "nome_cliente": "nome",
+        "nome_tecnico": "nome_tecnico",
+        "tecnico": "nome_tecnico",
+
+        # canais / papéis
+        "canal": "canal",
+        "especialista": "especialista",
+
+        # numerações
+        "numero_ordem_de_servico": "numero_os",
+        "numero_os": "numero_os",
+        "numero": "asm",  # no texto de instabilidade, [NÚMERO] = ASM
+
+        # erro/tipo/explicação
+        "tipo": "tipo_erro",
+        "tipo_erro": "tipo_erro",
+        "explique_a_situacao": "explique",
+        "explique": "explique",
+
+        # equipamento / sistema
+        "equipamento_sistema": "equipamento_sistema",
+
+        # outros
+        "asm": "asm",
+        "motivo": "motivo",
+        "item": "item",
+
+        # aliases extra
+        "erro_de_agendamento_encaixe": "motivo",
+        "demanda_excedida": "motivo",
+        "descreva_situacao": "item",
+        "descreva_situação": "item",
+    }
+
+    if t in ("descreva", "descrever", "descrever_problema", "descrever_o_problema",
+             "descreva_o_problema", "descricao_do_problema"):
+        return "descreber_o_problema"
+
+    return mapping.get(t, t)
+
+def chaves_datahora(norm: str):
+    """Chaves (data, hora) de um token __DATAHORA*__ normalizado."""
+    if norm == "__DATAHORA__":
+        return "data", "hora"
+    if norm == "__DATAHORA2__":
+        return "data_2", "hora_2"
+    if norm == "__DATAHORA3__":
+        return "data_3", "hora_3"
+    n = re.findall(r"__DATAHORA(\d+)__", norm)
+    n = n[0] if n else "1"
+    return f"data_{n}", f"hora_{n}"
+
+def build_mask(template: str, values: dict) -> str:
+    """Substitui [TOKENS] do template pelos valores digitados e remove tokens desconhecidos."""
+    text = str(template or "")
+    tokens = re.findall(r"\[([^\]]+)\]", text)
+    for tok in tokens:
+        norm = normalize_token(tok)
+
+        # DATA/HORA 1..N
+        if norm.startswith("__DATAHORA"):
+            d_key, h_key = chaves_datahora(norm)
+            d = values.get(d_key, "").strip()
+            h = values.get(h_key, "").strip()
+            rep = (f"{d} - {h}" if d and h else (d or h or ""))
+            text = text.replace(f"[{tok}]", rep)
+            continue
+
+        # chave normalizada direta
+        if norm in values and values.get(norm, "") != "":
+            text = text.replace(f"[{tok}]", values.get(norm, "").strip())
+            continue
+
+        # fallback por slug literal
+        s = slug(tok)
+        if s in values and values.get(s, "") != "":
+            text = text.replace(f"[{tok}]", values.get(s, "").strip())
+            continue
+
+        # token sem valor -> remover
+        text = text.replace(f"[{tok}]", "")
+
+    text = re.sub(r"\s+\.", ".", text)
+    text = re.sub(r"\s{2,}", " ", text)
+    return text.strip()
+
+@lru_cache(maxsize=None)
+def compilar_template(template: str) -> tuple:
+    """
+    Quebra o template em partes, na ordem: texto literal (str) ou slot de token.
+    Slots: ("datahora", chave_data, chave_hora) ou ("campo", chave_normalizada, slug).
+    """
+    partes = []
+    for i, parte in enumerate(re.split(r"(\[[^\]]+\])", str(template or ""))):
+        if i % 2 == 0:
+            if parte:
+                partes.append(parte)
+            continue
+        tok = parte[1:-1]
+        norm = normalize_token(tok)
+        if norm.startswith("__DATAHORA"):
+            partes.append(("datahora",) + chaves_datahora(norm))
+        else:
+            partes.append(("campo", norm, slug(tok)))
+    return tuple(partes)
+
+def build_mask_df(df: pd.DataFrame, col_motivo: str = "motivo_id", col_alt: str = "alt_id") -> pd.Series:
+    """
+    Versão vetorizada do build_mask para um DataFrame inteiro.
+    Cada linha traz o id do motivo, o id da versão da máscara e os valores dos campos
+    (colunas com as mesmas chaves do dict `values` do build_mask). As linhas são agrupadas
+    por template e cada grupo é montado com operações de string por coluna.
+    Retorna uma Series com as máscaras, no índice do `df`; o resultado é idêntico ao build_mask.
+    """
+    out = pd.Series([""] * len(df), index=df.index, dtype=object)
+    if df.empty:
+        return out
+    valores = df.fillna("").astype(str).reset_index(drop=True)
+    vazio = pd.Series("", index=valores.index, dtype=object)
+
+    grupos = valores.groupby([col_motivo, col_alt], sort=False).indices
+    for (motivo_id, alt_id), pos in grupos.items():
+        template = ALTERNATIVAS_POR_ID.get((motivo_id, alt_id), {}).get("template", "")
+        partes = compilar_template(template)
+        grupo = valores.iloc[pos]
+
+        def col(chave):
+            return grupo[chave] if chave in grupo.columns else vazio.iloc[pos]
+
+        texto = pd.Series("", index=grupo.index, dtype=object)
+        usados = []
+        for parte in partes:
+            if isinstance(parte, str):
+                texto = texto + parte
+            elif parte[0] == "datahora":
+                d, h = col(parte[1]).str.strip(), col(parte[2]).str.strip()
+                texto = texto + (d + " - " + h).where((d != "") & (h != ""), d + h)
+                usados += [parte[1], parte[2]]
+            else:
+                a, b = col(parte[1]), col(parte[2])
+                texto = texto + a.where(a != "", b).str.strip()
+                usados += [parte[1], parte[2]]
+
+        texto = (texto.str.replace(r"\s+\.", ".", regex=True)
+                      .str.replace(r"\s{2,}", " ", regex=True)
+                      .str.strip()
+                      .to_numpy(dtype=object))
+
+        # o build_mask substitui em sequência no texto já preenchido; com colchetes em valores
+        # ou literais isso pode divergir da montagem por partes, então essas linhas vão pelo build_mask
+        lentas = np.full(len(pos), any(("[" in p or "]" in p) for p in partes if isinstance(p, str)))
+        for chave in dict.fromkeys(usados):
+            if chave in grupo.columns:
+                lentas |= grupo[chave].str.contains(r"[\[\]]", regex=True).to_numpy(dtype=bool)
+        for j in np.flatnonzero(lentas):
+            texto[j] = build_mask(template, grupo.iloc[j].to_dict())
+
+        out.iloc[pos] = texto
+    return out
+
+def aplicar_aliases(valores: dict) -> dict:
+    """Preenche [NOME] a partir de cliente/nome_cliente quando não houver campo "nome"."""
+    if not valores.get("nome"):
+        for k in ("cliente", "nome_cliente"):
+            if valores.get(k):
+                valores["nome"] = valores[k]
+                break
+    return valores
+
+# =========================================================
+# Utilitários de campos
+# =========================================================
+def campos(*labels):
+    out = []
+    for lbl in labels:
+        if not lbl:
+            continue
+        out.append({"name": slug(lbl), "label": lbl, "placeholder": "", "required": True})
+    return out
+
+# =========================================================
+# Catálogo completo (1–23) com exemplos
+# =========================================================
+CATALOGO = [
+    # 1
+    {
+        "id": "alteracao_tipo_servico",
+        "titulo": "Alteração do tipo de serviço  – De assistência para reinstalação",
+        "acao": "Inserir ação no histórico da OS e entrar em contato com a central para cancelamento",
+        "quando_usar": "Quando durante a prestação de serviço o técnico identificar a necessidade de realizar outro tipo de execução.",
+        "exemplos": [
+            "1) A OS está como assistência, mas será necessário fazer uma Reinstalação. Cliente voltará no dia seguinte.",
+            "2) Necessário uma reinstalação completa, sem tempo hábil para realizar o atendimento."
+        ],
+        "campos": campos("Descreber o Problema", "Cliente"),
+        "mascaras": [{
+            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
+            "template": "Não foi possível realizar o atendimento devido [DESCREVER O PROBLEMA]. Cliente [NOME] foi informado sobre a necessidade de reagendamento."
+        }]
+    },
+    # 2
+    {
+        "id": "improdutivo_ponto_fixo_movel",
+        "titulo": "Atendimento Improdutivo – Ponto Fixo/Móvel",
+        "acao": "Cancelar agendamento",
+        "quando_usar": "Quando o veículo está presente mas não foi possível atender (problema mecânico, elétrico ou condição do veículo). Se ponto móvel, considere também quando o atendimento em campo não pôde ser feito por fatores externos (chuva ou local sem condição).",
+        "exemplos": [
+            "1) O cliente trouxe o veículo, ele compareceu para atendimento, mas o veículo apresentou falhas elétrica.",
+            "2) O local para atendimento não possuía cobertura para atendimento. (chuva, etc.)."
+        ],
+        "campos": campos("Descreber o Problema"),
+        "mascaras": [{
+            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
+            "template": "Veículo compareceu para atendimento, porém por [DESCREVER O PROBLEMA], não foi possível realizar o serviço."
+        }]
+    },
+    # 3
+    {
+        "id": "pedido_cliente",
+        "titulo": "Cancelada a Pedido do Cliente",
+        "acao": "Cancelar agendamento",
+        "quando_usar": "Quando o próprio cliente solicita o cancelamento do atendimento.",
+        "exemplos": [
+            "1) Cliente ligou pedindo para remarcar porque o motorista estaria em viagem, ou porque não chegaria a tempo, ou veículo está na oficina.",
+            "2) Entramos em contato com o cliente para confirmar o atendimento ele disse que o veículo estará em viagem ou indisponível."
+        ],
+        "campos": campos("Nome", "Canal", "Data", "Hora"),
+        "mascaras": [{
+            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
+            "template": "Cliente [NOME], contato via [CANAL] em [DATA/HORA], informou indisponibilidade para o atendimento."
+        }]
+    },
+    # 4
+    {
+        "id": "pedido_rt",
+        "titulo": "Cancelamento a pedido da RT",
+        "acao": "Cancelar agendamento",
+        "quando_usar": "Quando houver necessidade de cancelamento por parte do representante técnico.",
+        "exemplos": ["Devido a situações de atendimento, precisamos cancelar com o cliente."],
+        "campos": campos("Descreber o Problema", "Nome", "Data", "Hora"),
+        "mascaras": [{
+            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
+            "template": "Não foi possível realizar o atendimento devido [DESCREVER O PROBLEMA]. Cliente [NOME] em [DATA/HORA], foi informado sobre a necessidade de reagendamento."
+        }]
+    },
+    # 5
+    {
+        "id": "cronograma_substituicao_placa",
+        "titulo": "Cronograma de Instalação/Substituição de Placa",
+        "acao": "Cancelar agendamento",
+        "quando_usar": "Quando o atendimento faz parte de cronograma especial pré-acordado / operação especial.",
+        "exemplos": [
+            "1) Cliente substituiu por essa OS 462270287.",
+            "2) Operação especial, sem envio de veículo como substituição."
+        ],
+        "campos": campos("Número OS"),
+        "mascaras": [
+            {
+                "id": "com_os", "rotulo": "Substituição com OS", "descricao": "", "regras_obrig": ["numero_os"],
+                "template": "Realizado atendimento com substituição de placa. Foi realizado a alteração pela OS [NÚMERO ORDEM DE SERVIÇO]."
+            },
+            {
+                "id": "sem_os", "rotulo": "Operação especial (sem envio de veículo)", "descricao": "", "regras_obrig": [],
+                "template": "Cliente não enviou veículo para atendimento."
+            }
+        ]
+    },
+    # 6
+    {
+        "id": "erro_cliente_desconhecia",
+        "titulo": "Erro De Agendamento - Cliente desconhecia o agendamento",
+        "acao": "Cancelar agendamento",
+        "quando_usar": "OS foi agendada sem que o cliente tivesse sido informado previamente, resultando em ausência ou recusa no momento do atendimento técnico. Obrigatório informar: Nome do cliente que entrou em contato, horário do cancelamento e canal de contato (preferencialmente canal que seja possível a futura comprovação).",
+        "exemplos": [
+            "1) Técnico chegou e o cliente disse não ter solicitado nenhum serviço ou foi entrado em contato com o cliente e o mesmo informou que desconhecia o agendamento.​",
+            "2) Realizamos contato com o cliente ele informou que desconhecia o agendamento."
+        ],
+        "campos": campos("Nome Cliente", "Data", "Hora"),
+        "mascaras": [{
+            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
+            "template": "Em contato com o cliente [NOME CLIENTE], o mesmo informou que desconhecia o agendamento. Data contato: [DATA/HORA]."
+        }]
+    },
+    # 7
+    {
+        "id": "erro_endereco_incorreto",
+        "titulo": "Erro de Agendamento – Endereço incorreto",
+        "acao": "Cancelar agendamento",
+        "quando_usar": "Endereço informado na OS está incorreto ou incompleto, inviabilizando a chegada ao local para execução do serviço.",
+        "exemplos": ["Técnico direcionado para rua X, mas cliente está na rua Y, inviabilizando o atendimento."],
+        "campos": campos("Tipo erro", "Descreva", "Nome", "Data", "Hora"),
+        "mascaras": [{
+            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
+            "template": "Erro identificado no agendamento: [TIPO]. Situação: [DESCREVA]. Cliente [NOME] informado em [DATA/HORA]."
+        }]
+    },
+    # 8
+    {
+        "id": "erro_falta_info_os",
+        "titulo": "Erro de Agendamento – Falta de informações na O.S.",
+        "acao": "Cancelar agendamento",
+        "quando_usar": "OS criada com informações incompletas, como ausência de dados do cliente, tipo de serviço ou outros campos obrigatórios que inviabilizam o atendimento.",
+        "exemplos": ["Não há solução cadastrada no sistema."],
+        "campos": campos("Tipo erro", "Explique", "Nome", "Data", "Hora"),
+        "mascaras": [{
+            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
+            "template": "OS agendada apresentou erro de [TIPO] e foi identificado através de [EXPLIQUE A SITUAÇÃO]. Realizado o contato com o cliente [NOME], no dia [DATA/HORA]."
+        }]
+    },
+    # 9
+    {
+        "id": "erro_os_incorreta",
+        "titulo": "Erro de Agendamento – O.S. agendada incorretamente (tipo/motivo/produto)",
+        "acao": "Cancelar agendamento",
+        "quando_usar": "Erro na categorização do serviço ao agendar a OS (ex: tipo de atendimento ou produto incorreto), levando à impossibilidade de execução correta.",
+        "exemplos": [
+            "1) Cliente pediu assistência e foi agendada instalação por engano.",
+            "2) Agendamento no mesmo dia sem autorização."
+        ],
+        "campos": campos("Tipo erro", "Explique", "Nome", "Data", "Hora"),
+        "mascaras": [{
+            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
+            "template": "OS agendada apresentou erro de [TIPO] e foi identificado através de [EXPLIQUE A SITUAÇÃO]. Realizado o contato com o cliente [NOME], no dia [DATA/HORA]."
+        }]
+    },
+    # 10
+    {
+        "id": "erro_roteirizacao_movel",
+        "titulo": "Erro de roteirização do agendamento - Atendimento móvel",
+        "acao": "Cancelar agendamento",
+        "quando_usar": "Quando houver uma falha no agendamento, e permite que o cliente consiga fazer agendamento no portal do cliente de um dia para o outro ou no mesmo dia, sem considerar o deslocamento.",
+        "exemplos": ["Deslocamento de retorno não considerado, técnico sem tempo hábil para execução, comercial informado."],
+        "campos": campos("Descreber o Problema", "Cliente", "Data", "Hora", "Especialista", "Data", "Hora"),
+        "mascaras": [{
+            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
+            "template": "Não foi possível concluir o atendimento devido [DESCREVER O PROBLEMA]. Cliente [NOME] às [DATA/HORA] foi informado sobre a necessidade de reagendamento. Especialista [ESPECIALISTA] informado às [DATA/HORA 2]."
+        }]
+    },
+    # 11
+    {
+        "id": "falta_acessorios_imobilizado",
+        "titulo": "Falta De Equipamento - Acessórios Imobilizado",
+        "acao": "Cancelar agendamento",
+        "quando_usar": "Falta de acessórios que estão alocados (imobilizados) em outro atendimento, impedindo a realização do serviço agendado.",
+        "exemplos": ["Agendamento precisara ser cancelado, pois estamos sem o sensor temperatura NTC 10K , o mesmo foi pedido para a distribuição mas ainda não chegou."],
+        "campos": campos("Item", "Cliente", "Data", "Hora"),
+        "mascaras": [{
+            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
+            "template": "Atendimento não realizado por falta de [ITEM]. Cliente [NOME] informado em [DATA/HORA]."
+        }]
+    },
+    # 12
+    {
+        "id": "falta_item_reservado_incompativel",
+        "titulo": "Falta De Equipamento - Item Reservado Não Compatível",
+        "acao": "Cancelar agendamento",
+        "quando_usar": "Material reservado está incompatível com o veículo ou serviço solicitado, mesmo estando disponível no estoque.",
+        "exemplos": ["Instalação não concluída por falta de rastreador compatível."],
+        "campos": campos("Item", "Cliente", "Data", "Hora"),
+        "mascaras": [{
+            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
+            "template": "Atendimento não realizado por falta de [ITEM]. Cliente [NOME] informado em [DATA/HORA]."
+        }]
+    },
+    # 13
+    {
+        "id": "falta_material",
+        "titulo": "Falta De Equipamento - Material",
+        "acao": "Cancelar agendamento",
+        "quando_usar": "Ausência total de material necessário para a execução da OS, mesmo após verificação de estoque.",
+        "exemplos": ["Falta equipamento ADPLUS."],
+        "campos": campos("Item", "Cliente", "Data", "Hora"),
+        "mascaras": [{
+            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
+            "template": "Atendimento não realizado por falta de [ITEM]. Cliente [NOME] informado em [DATA/HORA]."
+        }]
+    },
+    # 14
+    {
+        "id": "falta_principal",
+        "titulo": "Falta De Equipamento - Principal",
+        "acao": "Cancelar agendamento",
+        "quando_usar": "Atendimento foi marcado, mas o técnico não tinha consigo o equipamento principal necessário, mesmo estando previsto para o serviço.",
+        "exemplos": [
+            "1) RT Com falta de equipamento LMU4233.​",
+            "2) Aguardando o equipamento RFID."
+        ],
+        "campos": campos("Item", "Cliente", "Data", "Hora"),
+        "mascaras": [{
+            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
+            "template": "Atendimento não realizado por falta de [ITEM]. Cliente [NOME] informado em [DATA/HORA]."
+        }]
+    },
+    # 15
+    {
+        "id": "instabilidade_sistema",
+        "titulo": "Instabilidade de Equipamento/Sistema",
+        "acao": "Contatar a central para conclusão; se não possível, registrar ação com nº da ASM.",
+        "quando_usar": "Quando deu problema no sistema ou no equipamento e não foi possível terminar o serviço.",
+        "exemplos": ["Rastreador não iniciou comunicação com a plataforma."],
+        "campos": campos("Data", "Hora", "Equipamento/Sistema", "Data", "Data", "Hora", "ASM"),
+        "mascaras": [{
+            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
+            "template": (
+                "Atendimento finalizado em [DATA/HORA] não concluído devido à instabilidade de "
+                "[EQUIPAMENTO/SISTEMA]. Registrado teste/reinstalação em [DATA 2]. "
+                "Realizado contato com a central [DATA/HORA 3] e foi gerada a ASM [NÚMERO]."
+            )
+        }]
+    },
+    # 16
+    {
+        "id": "no_show_cliente",
+        "titulo": "No-show Cliente – Ponto Fixo/Móvel",
+        "acao": "Cancelar agendamento",
+        "quando_usar": "Quando o cliente não aparece no local/empresa (fixo) ou não está disponível no ponto móvel.",
+        "exemplos": ["O técnico chegou ao cliente, mas o caminhão estava em rota de viagem, o veículo não compareceu no ponto de atendimento, o veículo chegou com atraso superior a 15 minutos."],
+        "campos": campos("Hora"),
+        "mascaras": [{
+            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
+            "template": "Cliente não compareceu para atendimento até às [HORA]."
+        }]
+    },
+    # 17
+    {
+        "id": "no_show_tecnico",
+        "titulo": "No-show Técnico",
+        "acao": "Cancelar agendamento",
+        "quando_usar": "Quando o técnico não comparece no horário/local.",
+        "exemplos": ["Técnico não realizou o atendimento."],
+        "campos": campos("Nome Técnico", "Data", "Hora", "Motivo"),
+        "mascaras": [{
+            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
+            "template": "Técnico [NOME TÉCNICO], em [DATA/HORA], não realizou o atendimento por motivo de [MOTIVO]."
+        }]
+    },
+    # 18
+    {
+        "id": "oc_tecnico_impossivel",
+        "titulo": "Ocorrência com Técnico – Não foi possível realizar atendimento",
+        "acao": "Cancelar agendamento",
+        "quando_usar": "Quando o técnico não consegue realizar o atendimento por questões pessoais ou operacionais, como: Problemas de saúde e pessoais; Problemas no veículo do técnico ou acidentes, ou outras impossibilidades de comparecer ao local. Deve ser informar horário, nome do cliente e canal de contato (voz, e-mail, whatsapp) que foi informado o cliente sobre a impossibilidade de atendimento.",
+        "exemplos": ["Técnico não se sentiu bem e teve que se ausentar na tarde de hoje."],
+        "campos": campos("Descreber o Problema", "Nome"),
+        "mascaras": [{
+            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
+            "template": "Não foi possível realizar o atendimento devido [DESCREVER O PROBLEMA]. Cliente [NOME] foi informado sobre a necessidade de reagendamento."
+        }]
+    },
+    # 19
+    {
+        "id": "oc_tecnico_parcial",
+        "titulo": "Ocorrência Com Técnico - Sem Tempo Hábil Para Realizar O Serviço (Atendimento Parcial)",
+        "acao": "Cancelar agendamento",
+        "quando_usar": "Quando iniciado o atendimento, porém foi identificado que não será possível concluir o serviço.",
+        "exemplos": ["Técnico começou a realizar o serviço e não conseguiu finalizar o atendimento no mesmo dia."],
+        "campos": campos("Descreber o Problema", "Cliente", "Data", "Hora"),
+        "mascaras": [{
+            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
+            "template": "Não foi possível concluir o atendimento devido [DESCREVER O PROBLEMA]. Cliente [NOME] às [DATA/HORA] foi informado sobre a necessidade de reagendamento."
+        }]
+    },
+    # 20
+    {
+        "id": "oc_tecnico_nao_iniciado",
+        "titulo": "Ocorrência Com Técnico - Sem Tempo Hábil Para Realizar O Serviço (Não iniciado)",
+        "acao": "Cancelar agendamento",
+        "quando_usar": " Quando não houve tempo suficiente por erro de agendamento, encaixe, atraso em OS anterior ou roteirização ruim e o atendimento não foi iniciado.",
+        "exemplos": [" Atendimento anterior demorou muito mais que o previsto e inviabilizou o próximo."],
+        "campos": campos("Motivo", "Cliente"),
+        "mascaras": [{
+            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
+            "template": "Motivo: [MOTIVO]. Cliente [NOME] informado do reagendamento."
+        }]
+    },
+    # 21
+    {
+        "id": "oc_tecnico_sem_habilidade",
+        "titulo": "Ocorrência Com Técnico - Técnico Sem Habilidade Para Realizar Serviço",
+        "acao": "Cancelar agendamento",
+        "quando_usar": "Quando o representante técnico identifica que o atendimento não pode ser realizado, devido a falta de habilidade específica do técnico.",
+        "exemplos": ["Atendimento roteirizado na agenda do técnico instalador sem a habilidade necessária para a realização do serviço"],
+        "campos": campos("Descreber o Problema", "Cliente"),
+        "mascaras": [{
+            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
+            "template": "Não foi possível realizar o atendimento devido [DESCREVER O PROBLEMA]. Cliente [NOME] foi informado sobre a necessidade de reagendamento."
+        }]
+    },
+    # 22
+    {
+        "id": "perda_extravio_defeito",
+        "titulo": "Perda/Extravio/Falta Do Equipamento/Equipamento Com Defeito",
+        "acao": "Cancelar agendamento",
+        "quando_usar": "Quando o técnico identifica que o equipamento/acessório não está mais no veículo ou por falta de condições de mau uso não é possível realizar o atendimento, e o cliente se recusa a assinar o termo de cobrança.",
+        "exemplos": ["Veículo esta no local mas não tem todos os equipamentos, novo proprietário não aceitou assinar o termo de Mau Uso."],
+        "campos": campos("Descreber o Problema"),
+        "mascaras": [{
+            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
+            "template": "Não foi possível realizar o atendimento, pois [DESCREVER PROBLEMA]. Cliente se recusou assinar termo."
+        }]
+    },
+    # 23
+    {
+        "id": "servico_incompativel_os",
+        "titulo": "Serviço incompatível com a OS aberta",
+        "acao": "Cancelar agendamento",
+        "quando_usar": "Quando iniciado o atendimento, porém foi identificado que o equipamento/material separado não atende as necessidades para conclusão do serviço.",
+        "exemplos": ["Técnico foi para atendimento, porém identificou que é necessário utilizar outro equipamento do que foi descrito como problema."],
+        "campos": campos("Descreber o Problema", "Cliente", "Data", "Hora"),
+        "mascaras": [{
+            "id": "padrao", "rotulo": "Padrão", "descricao": "", "regras_obrig": [],
+            "template": "Não foi possível concluir o atendimento devido [DESCREVER O PROBLEMA]. Cliente [NOME] às [DATA/HORA] foi informado sobre a necessidade de reagendamento."
+        }]
+    },
+]
+
+# =========================================================
+# AUTO-FIX DE TOKENS DO CATÁLOGO (blindagem)
+# =========================================================
+# tokens canônicos (para reescrita “visual” nos templates)
+CANON_EQUIV = {
+    "NOME": "nome",
+    "NOME CLIENTE": "nome",
+    "CLIENTE": "nome",
+    "NOME TÉCNICO": "nome_tecnico",
+    "TÉCNICO": "nome_tecnico",
+    "CANAL": "canal",
+    "ESPECIALISTA": "especialista",
+    "TIPO": "tipo_erro",
+    "EXPLIQUE A SITUAÇÃO": "explique",
+    "EQUIPAMENTO/SISTEMA": "equipamento_sistema",
+    "ITEM": "item",
+    "MOTIVO": "motivo",
+    "NÚMERO ORDEM DE SERVIÇO": "numero_os",
+    "NÚMERO": "asm",
+    "DATA": "data",
+    "HORA": "hora",
+    "DATA/HORA": "__DATAHORA__",
+}
+
+def _token_guess(tok_raw: str):
+    """Deduz um token canônico textual para reescrita no template."""
+    t = slug(tok_raw)
+
+    # pares DATA/HORA com índice
+    m = re.match(r"^data_hora(?:_(\d+))?$", t)
+    if m:
+        idx = m.group(1)
+        return "DATA/HORA" if not idx or idx == "1" else f"DATA/HORA {idx}"
+
+    # data/hora isolados com índice
+    m = re.match(r"^(data|hora)(?:_(\d+))?$", t)
+    if m:
+        base, idx = m.group(1), m.group(2)
+        base_up = "DATA" if base == "data" else "HORA"
+        return base_up if not idx or idx == "1" else f"{base_up} {idx}"
+
+    # nomes
+    if "cliente" in t or t == "nome":
+        return "NOME"
+    if "tecnico" in t:
+        return "NOME TÉCNICO"
+
+    # termos comuns
+    if "canal" in t: return "CANAL"
+    if "especial" in t: return "ESPECIALISTA"
+    if "equipamento" in t or "sistema" in t: return "EQUIPAMENTO/SISTEMA"
+    if "motivo" in t: return "MOTIVO"
+    if t.startswith("tipo"): return "TIPO"
+    if "explique" in t or "situacao" in t: return "EXPLIQUE A SITUAÇÃO"
+    if "item" in t: return "ITEM"
+    if "numero_ordem" in t or t == "numero_os": return "NÚMERO ORDEM DE SERVIÇO"
+    if t == "numero": return "NÚMERO"
+
+    # problema / descrever
+    if "descr" in t and "problem" in t:
+        return "DESCREVER O PROBLEMA"
+
+    return None
+
+def aplicar_auto_fix_catalogo(catalogo, ajustes=None):
+    """Reescreve tokens fora do padrão nos templates; os ajustes feitos são anotados em `ajustes`."""
+    cat = copy.deepcopy(catalogo)
+    fixes = []
+    for m in cat:
+        for mask in m.get("mascaras", []):
+            tpl = str(mask.get("template", ""))
+            tokens = re.findall(r"\[([^\]]+)\]", tpl)
+            for tok in tokens:
+                # se normalize_token já resolve, deixa como está
+                if normalize_token(tok) != slug(tok):
+                    continue
+                guess = _token_guess(tok)
+                if not guess:
+                    continue
+                # normaliza sinônimos para um único canônico “visual”
+                if guess in ("NOME CLIENTE", "CLIENTE"):
+                    guess = "NOME"
+                if guess != tok:
+                    tpl_new = tpl.replace(f"[{tok}]", f"[{guess}]")
+                    if tpl_new != tpl:
+                        fixes.append(f'{m["id"]}: [{tok}] → [{guess}]')
+                        tpl = tpl_new
+            mask["template"] = tpl
+    if ajustes is not None:
+        ajustes.extend(fixes)
+    return cat
+
+AJUSTES_AUTO_FIX = []  # exibidos pelo app na inicialização
+CATALOGO = aplicar_auto_fix_catalogo(CATALOGO, AJUSTES_AUTO_FIX)
+
+
+# =========================================================
+# Índices do catálogo
+# =========================================================
+CATALOGO_POR_ID = {m["id"]: m for m in CATALOGO}
+ALTERNATIVAS_POR_ID = {(m["id"], a["id"]): a for m in CATALOGO for a in m["mascaras"]}
+
+def nomes_efetivos(motivo) -> list:
+    """Chaves dos campos do motivo (repetidos ganham sufixo _2, _3...)."""
+    out, counts = [], {}
+    for c in motivo["campos"]:
+        occ = counts.get(c["name"], 0) + 1
+        counts[c["name"]] = occ
+        out.append(c["name"] if occ == 1 else f"{c['name']}_{occ}")
+    return out
+
+COLUNAS_BASE = ["Número OS (consulta)", "Motivo", "Versão máscara", "Ação sistêmica", "Quando usar", "Máscara"]
+
+def colunas_campos(motivo) -> list:
+    """
+    Rótulos das colunas dos campos do motivo (repetidos ganham sufixo ' 2', ' 3'...).
+    Campo com o mesmo rótulo de uma coluna fixa (ex.: "Motivo") vira "Motivo (campo)",
+    para não sobrescrever o título do motivo na exportação.
+    """
+    out, counts = [], {}
+    for c in motivo["campos"]:
+        occ = counts.get(c["label"], 0) + 1
+        counts[c["label"]] = occ
+        col = c["label"] if occ == 1 else f"{c['label']} {occ}"
+        out.append(f"{col} (campo)" if col in COLUNAS_BASE else col)
+    return out
+
+NOMES_EFETIVOS = {m["id"]: nomes_efetivos(m) for m in CATALOGO}
+COLUNAS_CAMPOS = {m["id"]: colunas_campos(m) for m in CATALOGO}
+
+# =========================================================
+# Leitura de planilhas (importação e lote)
+# =========================================================
+IMPORT_CHUNK_LINHAS = 5000  # linhas por bloco na leitura do CSV
+
+MOTIVO_POR_TITULO = {m["titulo"]: m["id"] for m in CATALOGO}
+ALT_POR_ROTULO = {(m["id"], a["rotulo"]): a["id"] for m in CATALOGO for a in m["mascaras"]}
+
+def texto_celula(v) -> str:
+    """Valor de célula como texto (vazio para None/NaN; 123.0 → "123")."""
+    if v is None or (isinstance(v, float) and v != v):
+        return ""
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return str(v).strip()
+
+def iterar_planilha(arquivo, nome: str):
+    """
+    Lê a planilha em streaming: primeiro o cabeçalho, depois cada linha (tupla de células).
+    xlsx via openpyxl em modo read-only; csv em blocos de IMPORT_CHUNK_LINHAS.
+    """
+    if nome.lower().endswith(".csv"):
+        primeiro = True
+        for bloco in pd.read_csv(arquivo, dtype=str, keep_default_na=False,
+                                 encoding="utf-8-sig", chunksize=IMPORT_CHUNK_LINHAS):
+            if primeiro:
+                yield tuple(bloco.columns)
+                primeiro = False
+            yield from bloco.itertuples(index=False, name=None)
+        return
+    import openpyxl
+    wb = openpyxl.load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        ws = wb["No-show"] if "No-show" in wb.sheetnames else wb.worksheets[0]
+        yield from ws.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+def campos_faltando(motivo, alternativa, valores: tuple) -> list:
+    """Rótulos dos campos obrigatórios sem valor (mesma regra da tela)."""
+    obrig_extra = set(alternativa.get("regras_obrig", []))
+    return [c["label"] for c, v in zip(motivo["campos"], valores)
+            if (c.get("required", False) or c["name"] in obrig_extra) and not v]
+
+class MapaColunas:
+    """Posições das colunas de uma planilha no formato da tabela (motivo, versão da máscara e campos pelos rótulos)."""
+
+    def __init__(self, cabecalho):
+        self.col = {}
+        for i, c in enumerate(cabecalho):
+            self.col.setdefault(texto_celula(c), i)
+        self.campos = {mid: tuple(self.col.get(c) for c in cols) for mid, cols in COLUNAS_CAMPOS.items()}
+
+    def cel(self, row, coluna: str) -> str:
+        i = self.col.get(coluna)
+        return texto_celula(row[i]) if i is not None and i < len(row) else ""
+
+    def ler(self, row):
+        """
+        (motivo_id, alt_id, valores, erro) da linha. Com motivo ou versão desconhecidos, os ids vêm None;
+        com campos obrigatórios vazios, os valores vêm preenchidos e o erro descreve o que falta.
+        """
+        titulo = self.cel(row, "Motivo")
+        motivo_id = MOTIVO_POR_TITULO.get(titulo) or (titulo if titulo in CATALOGO_POR_ID else None)
+        if motivo_id is None:
+            return None, None, (), f"motivo desconhecido ({titulo or 'vazio'})"
+        motivo = CATALOGO_POR_ID[motivo_id]
+        rotulo = self.cel(row, "Versão máscara")
+        alt_id = ALT_POR_ROTULO.get((motivo_id, rotulo))
+        if alt_id is None and (motivo_id, rotulo) in ALTERNATIVAS_POR_ID:
+            alt_id = rotulo
+        if alt_id is None and not rotulo and len(motivo["mascaras"]) == 1:
+            alt_id = motivo["mascaras"][0]["id"]
+        if alt_id is None:
+            return motivo_id, None, (), f"versão da máscara desconhecida ({rotulo or 'vazio'})"
+        valores = tuple(texto_celula(row[i]) if i is not None and i < len(row) else ""
+                        for i in self.campos[motivo_id])
+        faltando = campos_faltando(motivo, ALTERNATIVAS_POR_ID[(motivo_id, alt_id)], valores)
+        erro = f"campos obrigatórios vazios ({', '.join(faltando)})" if faltando else None
+        return motivo_id, alt_id, valores, erro
+
+# =========================================================
+# Lote (executado nos processos)
+# =========================================================
+def colunas_unicas(cabecalho) -> list:
+    """Nomes do cabeçalho como texto, sem repetição (repetidos ganham sufixo ' 2', ' 3'...)."""
+    out, counts = [], {}
+    for c in cabecalho:
+        c = texto_celula(c) or "Coluna"
+        occ = counts.get(c, 0) + 1
+        counts[c] = occ
+        out.append(c if occ == 1 else f"{c} {occ}")
+    return out
+
+def colunas_resultado(cabecalho) -> list:
+    """Colunas do arquivo de resultado do lote: as originais + "Máscara" + "Erros" (se ainda não existirem)."""
+    colunas = colunas_unicas(cabecalho)
+    return colunas + [c for c in ("Máscara", "Erros") if c not in colunas]
+
+def processar_bloco_lote(cabecalho: tuple, primeira: int, linhas: list, n_previa: int = 0):
+    """
+    Valida e gera as máscaras de um bloco da planilha (linhas do CSV como listas de texto, sem o cabeçalho).
+    `primeira` é o nº, na planilha, da primeira linha do bloco. Roda nos processos do lote.
+    Linhas com mais colunas preenchidas que o cabeçalho são registradas em "Erros", sem máscara.
+    Retorna (CSV do bloco sem cabeçalho, linhas processadas, linhas com erro, prévia com até `n_previa` linhas).
+    """
+    mapa = MapaColunas(cabecalho)
+    colunas = colunas_unicas(cabecalho)
+    n_cols = len(colunas)
+    registros, erros, celulas = [], [], []
+    for n, row in enumerate(linhas, start=primeira):
+        excedentes = any(texto_celula(v) for v in row[n_cols:])
+        row = tuple(texto_celula(v) for v in row[:n_cols])
+        if not any(row) and not excedentes:
+            continue
+        if excedentes:
+            # separador sem aspas dentro de um valor: as colunas ficaram deslocadas, a máscara sairia errada
+            registros.append({"motivo_id": "", "alt_id": ""})
+            erros.append(f"Linha {n}: mais colunas que o cabeçalho ({n_cols}); confira separadores e aspas.")
+            celulas.append(row)
+            continue
+        motivo_id, alt_id, valores, erro = mapa.ler(row)
+        registro = {"motivo_id": motivo_id or "", "alt_id": alt_id or ""}
+        if alt_id is not None:
+            registro.update(aplicar_aliases(dict(zip(NOMES_EFETIVOS[motivo_id], valores))))
+        registros.append(registro)
+        erros.append(f"Linha {n}: {erro}." if erro else "")
+        celulas.append(row + ("",) * (n_cols - len(row)))
+    out = pd.DataFrame(celulas, columns=colunas)
+    out["Máscara"] = build_mask_df(pd.DataFrame(registros)).to_numpy()
+    out["Erros"] = erros
+    com_erro = int((out["Erros"] != "").sum())
+    return out.to_csv(index=False, header=False).encode("utf-8"), len(out), com_erro, out.head(n_previa)
+
+def formato_csv(data: bytes):
+    """
+    (encoding, separador) de um CSV enviado. UTF-8 (com ou sem BOM) ou, se o início do arquivo não
+    decodificar, cp1252; separador "," ou ";" (Excel em pt-BR), o que mais divide a linha do cabeçalho.
+    """
+    amostra = data[:65536]
+    try:
+        codecs.getincrementaldecoder("utf-8-sig")().decode(amostra)  # sem final=True: tolera caractere cortado
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError:
+        encoding = "cp1252"
+    linha = next(iter(amostra.decode(encoding, errors="replace").splitlines()), "")
+    separador = max((",", ";"), key=lambda sep: len(next(csv.reader([linha], delimiter=sep))))
+    return encoding, separador
+
+def xlsx_para_csv(data: bytes) -> bytes:
+    """Converte a planilha xlsx (lida em streaming) em CSV com as células já como texto; roda num processo do lote."""
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    for row in iterar_planilha(io.BytesIO(data), "planilha.xlsx"):
+        w.writerow([texto_celula(v) for v in row])
+    return buf.getvalue().encode("utf-8")